@@ -0,0 +1,162 @@
+-- qry_courtsession_changes.sql 20251020
+--
+-- Court sessions created, changed or deleted since a high-water mark, for the delta sync
+-- of gen_court_session_calendar.py (--delta-sync).
+--
+-- Parameters (in order):
+--   @pBeginDate  date      First session date of the calendar year.
+--   @pEndDate    date      Last session date of the calendar year.
+--   @pSince      datetime  High-water mark less [SQL] delta_sync_overlap_minutes, so that changes
+--                          committed late with an earlier timestamp are fetched too.
+--                          null for the initial (full year) sync.
+--
+-- With @pSince null, all sessions of @pBeginDate..@pEndDate are returned.
+-- Else, all sessions changed since @pSince are returned, whatever their session date, so
+-- that sessions moved out of the year are updated too.
+-- Deleted sessions and sessions not in the court house are returned as well (Deleted/Included),
+-- they replace the sessions' earlier rows in the local store.
+
+SET NOCOUNT ON;
+declare
+  @pBeginDate date = ?
+  ,@pEndDate date = ?
+  ,@pSince datetime = ?
+;
+
+drop table if exists #changed;
+create table #changed
+(
+  CourtSessionID int primary key
+);
+if @pSince is null
+begin
+  insert into #changed
+  select
+    CtS.CourtSessionID
+  from
+    Justice.dbo.CtSession CtS
+  where
+    CtS.SessionDate >= @pBeginDate
+    and CtS.SessionDate < dateadd(day,1,@pEndDate)
+  ;
+end
+else
+begin
+  insert into #changed
+  select
+    CtS.CourtSessionID
+  from
+    Justice.dbo.CtSession CtS
+  where
+    CtS.TimestampCreate >= @pSince
+    or CtS.TimestampChange >= @pSince
+    or CtS.TimestampMajorChange >= @pSince
+  union
+  select
+    CtSB.CourtSessionID
+  from
+    Justice.dbo.CtSessionBlock CtSB
+    inner join Justice.dbo.Setting S
+    on
+      S.CourtSessionBlockID = CtSB.CourtSessionBlockID
+  where
+    S.TimestampChange >= @pSince
+  ;
+end -- else
+
+-- Court session resources (location, judicial officer, court room).
+;with Resource as
+(
+  select
+    CtSCRB.CourtSessionID
+    ,uC_CRT.Code as CalendarResourceTypeCode
+    ,uC_CR.Code as CalendarResourceCode
+    ,uC_CR.Description as CalendarResourceDescription
+  from
+    Justice.dbo.CtSessionClndrResBucket CtSCRB
+    inner join Justice.dbo.uCode uC_CRT
+    on
+      uC_CRT.CodeID = CtSCRB.CalendarResourceTypeID
+      and uC_CRT.Code in ('L','JO','CTRM')
+    inner join Justice.dbo.xCtSessionClndrRes CtSCR
+    on
+      CtSCR.CalendarResourceBucketID = CtSCRB.CalendarResourceBucketID
+    inner join Justice.dbo.uCode uC_CR
+    on
+      uC_CR.CodeID = CtSCR.CalendarResourceID
+)
+select distinct
+  CtS.CourtSessionID
+  ,cast(CtS.SessionDate as date) as SessionDate
+  ,left(cast(CtS.StartTime as time),5) as StartTime
+  ,CtS.Description as SessionDescription
+  ,uC_Clndr.Description as CalendarDescription
+  ,JO.CalendarResourceCode as JudicialOfficerCode
+  ,JO.CalendarResourceDescription as JudicialOfficerDescription
+  ,CTRM.CalendarResourceCode as CourtRoomCode
+  ,CTRM.CalendarResourceDescription as CourtRoomDescription
+  ,cast(CtS.Deleted as bit) as Deleted
+  -- Same court house filter as sp_getCourtSessionsByYear.
+  ,cast(
+    case
+      when
+        exists (select 1 from Justice.dbo.CtSessionBlock CtSB where CtSB.CourtSessionID = CtS.CourtSessionID)
+        and
+        (
+          L.CalendarResourceCode = 'FCCH'
+          or
+          L.CalendarResourceCode is null and CTRM.CalendarResourceCode in ('401','402','501','502','503','504','JAR')
+        )
+      then 1
+      else 0
+    end
+    as bit
+  ) as Included
+  ,Chg.ChangedAt
+from
+  #changed C
+  inner join Justice.dbo.CtSession CtS
+  on
+    CtS.CourtSessionID = C.CourtSessionID
+  inner join Justice.dbo.uCode uC_Clndr
+  on
+    uC_Clndr.CodeID = CtS.CalendarID
+  -- Latest change of the session or its settings, the source of the high-water mark.
+  cross apply
+  (
+    select
+      max(T.TimestampValue) as ChangedAt
+    from
+    (
+      select CtS.TimestampCreate as TimestampValue
+      union all
+      select CtS.TimestampChange
+      union all
+      select CtS.TimestampMajorChange
+      union all
+      select
+        S.TimestampChange
+      from
+        Justice.dbo.CtSessionBlock CtSB
+        inner join Justice.dbo.Setting S
+        on
+          S.CourtSessionBlockID = CtSB.CourtSessionBlockID
+      where
+        CtSB.CourtSessionID = CtS.CourtSessionID
+    ) T
+  ) Chg
+  left outer join Resource L
+  on
+    L.CourtSessionID = CtS.CourtSessionID
+    and L.CalendarResourceTypeCode = 'L'
+  left outer join Resource JO
+  on
+    JO.CourtSessionID = CtS.CourtSessionID
+    and JO.CalendarResourceTypeCode = 'JO'
+  left outer join Resource CTRM
+  on
+    CTRM.CourtSessionID = CtS.CourtSessionID
+    and CTRM.CalendarResourceTypeCode = 'CTRM'
+order by
+  CtS.CourtSessionID
+;
@@ -0,0 +1,98 @@
+-- qry_courtsessions_by_date_range.sql 20251020
+--
+-- Lean companion of Justice.fc.sp_getCourtSessionsByYear for gen_court_session_calendar.py
+-- ([SQL] court_sessions_query = lean).
+--
+-- Parameters (in order):
+--   @pBeginDate  date  First session date.
+--   @pEndDate    date  Last session date.
+--
+-- Same court sessions as the stored procedure, without its #CtSessionCourtHouse temp table:
+--   - No Setting join (one row per hearing setting) and no AppUser audit joins.
+--     CtSessionBlock is only tested for existence.
+--   - A session with several location, judicial officer or court room resources still fans
+--     out, so the rows are made distinct over the procedure's DISTINCT columns (calendar and
+--     resource descriptions included), as the procedure does.
+--   - The resource buckets are read once (Resource) instead of three subqueries.
+--   - SessionDate is filtered with a sargable range instead of cast(... as date) between.
+--   - Only the columns used by convert_df_to_list() are returned.
+
+SET NOCOUNT ON;
+declare
+  @pBeginDate date = ?
+  ,@pEndDate date = ?
+;
+
+-- Court session resources (location, judicial officer, court room).
+with Resource as
+(
+  select
+    CtSCRB.CourtSessionID
+    ,uC_CRT.Code as CalendarResourceTypeCode
+    ,uC_CR.Code as CalendarResourceCode
+    ,uC_CR.Description as CalendarResourceDescription
+  from
+    Justice.dbo.CtSessionClndrResBucket CtSCRB
+    inner join Justice.dbo.uCode uC_CRT
+    on
+      uC_CRT.CodeID = CtSCRB.CalendarResourceTypeID
+      and uC_CRT.Code in ('L','JO','CTRM')
+    inner join Justice.dbo.xCtSessionClndrRes CtSCR
+    on
+      CtSCR.CalendarResourceBucketID = CtSCRB.CalendarResourceBucketID
+    inner join Justice.dbo.uCode uC_CR
+    on
+      uC_CR.CodeID = CtSCR.CalendarResourceID
+)
+select
+  SessionDate
+  ,StartTime
+  ,SessionDescription
+  ,JudicialOfficerCode
+  ,CourtRoomCode
+from
+(
+  select distinct
+    cast(CtS.SessionDate as date) as SessionDate
+    ,left(cast(CtS.StartTime as time),5) as StartTime
+    ,CtS.Description as SessionDescription
+    ,uC_Clndr.Description as CalendarDescription
+    ,JO.CalendarResourceCode as JudicialOfficerCode
+    ,JO.CalendarResourceDescription as JudicialOfficerDescription
+    ,CTRM.CalendarResourceCode as CourtRoomCode
+    ,CTRM.CalendarResourceDescription as CourtRoomDescription
+  from
+    Justice.dbo.CtSession CtS
+    inner join Justice.dbo.uCode uC_Clndr
+    on
+      uC_Clndr.CodeID = CtS.CalendarID
+    left outer join Resource L
+    on
+      L.CourtSessionID = CtS.CourtSessionID
+      and L.CalendarResourceTypeCode = 'L'
+    left outer join Resource JO
+    on
+      JO.CourtSessionID = CtS.CourtSessionID
+      and JO.CalendarResourceTypeCode = 'JO'
+    left outer join Resource CTRM
+    on
+      CTRM.CourtSessionID = CtS.CourtSessionID
+      and CTRM.CalendarResourceTypeCode = 'CTRM'
+  where
+    CtS.SessionDate >= @pBeginDate
+    and CtS.SessionDate < dateadd(day,1,@pEndDate)
+    and CtS.Deleted = 0
+    and exists (select 1 from Justice.dbo.CtSessionBlock CtSB where CtSB.CourtSessionID = CtS.CourtSessionID)
+    and
+    (
+      L.CalendarResourceCode = 'FCCH'
+      or
+      L.CalendarResourceCode is null and CTRM.CalendarResourceCode in ('401','402','501','502','503','504','JAR')
+    )
+) CtS_D
+order by
+  SessionDate
+  ,StartTime
+  ,SessionDescription
+  ,CalendarDescription
+;
@@ -1,38 +1,73 @@
 # gen_court_session_calendar.py 20251022
 
+import bisect
 import calendar
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
 import configparser
 import copy
-from datetime import date, datetime, timedelta
+import functools
+import hashlib
+from datetime import date, datetime, timedelta, timezone
 import duckdb
+import json
 from enum import Enum
 from icecream import ic
 from loguru import logger
 from openpyxl import Workbook
+from openpyxl import __version__ as openpyxl_version
 from openpyxl import load_workbook
-from openpyxl.cell import Cell
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.cell.cell import MergedCell
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.packaging.custom import StringProperty
+from openpyxl.packaging.relationship import RelationshipList
 from openpyxl.styles import Font, PatternFill, Border, Side, Fill, Alignment
+from openpyxl.styles.cell_style import StyleArray
 from openpyxl.utils import get_column_letter, column_index_from_string, coordinate_to_tuple, range_boundaries
+from openpyxl.worksheet._writer import WorksheetWriter
 from openpyxl.worksheet.cell_range import CellRange
 from openpyxl.worksheet.worksheet import Worksheet, MergedCellRange
+from openpyxl.writer.excel import ExcelWriter
 import os
 import pandas as pd
+import pickle
 from pandas import DataFrame # Import the specific class for hinting
 from pathlib import Path
 import pyodbc
 import re
+import shutil
+import stat
+import struct
 from sqlalchemy import create_engine
 import sys
+import tempfile
+import time
 import urllib
 import typer
 from typing import List
 import yaml
+import zipfile
+import zlib
 
 #==============================================================================
 # Constants
 #==============================================================================
 debugging_skip_code = False
 MAX_ROW = None
+# Columns of the court sessions returned by Justice.fc.sp_getCourtSessionsByYear.
+COURT_SESSION_COLUMNS = [
+    'SessionDate'
+    ,'StartTime'
+    ,'SessionDescription'
+    ,'CalendarDescription'
+    ,'JudicialOfficerCode'
+    ,'JudicialOfficerDescription'
+    ,'CourtRoomCode'
+    ,'CourtRoomDescription'
+]
+# Custom document property of the output workbook holding the digests of its month sheets' inputs.
+MONTH_DIGESTS_PROPERTY = 'CourtSessionCalendarMonthDigests'
 #------------------------------------------------------------------------------
 #==============================================================================
 # Classes
@@ -41,6 +76,1354 @@ class SourcePDFError(Exception):
     """The source PDF causes an error."""
     pass
 #------------------------------------------------------------------------------
+class DuplicateKeySafeLoader(yaml.SafeLoader):
+    """
+    yaml.SafeLoader that logs mapping keys given more than once.
+    (yaml.safe_load() silently keeps the last value of a duplicated key.)
+    """
+    def construct_mapping(self, node, deep=False):
+        keys = set()
+        for key_node, _ in node.value:
+            key = self.construct_object(key_node, deep=deep)
+            if isinstance(key,str) and key in keys:
+                logger.warning(f"Duplicate YAML key '{key}' at line {key_node.start_mark.line + 1}, the last value is used.")
+            keys.add(key)
+        return super().construct_mapping(node, deep=deep)
+#------------------------------------------------------------------------------
+class AbbreviationMatcher:
+    """
+    The abbreviation_keys compiled into one case-insensitive regular expression.
+    The phrases are tried longest first, so where phrases overlap (e.g. 'Traffic' and
+    'Traffic Violations Bureau') the longest one is abbreviated, and each description is
+    rewritten in a single pass. A null abbreviation removes the phrase.
+    """
+    def __init__(self, abbreviation_keys: tuple):
+        # Lowercase phrase -> abbreviation.
+        self.abbreviations = {}
+        for phrase,abbrev in abbreviation_keys:
+            key = phrase.lower()
+            if key in self.abbreviations:
+                logger.warning(f"Duplicate abbreviation key '{phrase}' ignoring case, the last abbreviation '{abbrev}' is used.")
+            self.abbreviations[key] = abbrev if abbrev is not None else ''
+        phrases = sorted(self.abbreviations, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(re.escape(phrase) for phrase in phrases), re.IGNORECASE) if phrases else None
+    #--------------------------------------------------------------------------
+    def apply(self, text: str) -> str:
+        """Returns text with the phrases replaced by their abbreviations."""
+        if self.pattern is None or not text:
+            return text
+        return self.pattern.sub(lambda match: self.abbreviations[match.group(0).lower()], text)
+#------------------------------------------------------------------------------
+class SessionMappingMatcher:
+    """
+    The sessions_mapping odyssey_names compiled into a best-match classifier of the court
+    session descriptions. Descriptions and names are tokenized (uppercase, hyphens dropped),
+    and a mapping matches when each of its tokens starts a description token, in order
+    (e.g. 'SU CV SP SET BENCH TRIAL' matches '(JSB) SU CV - Special Set Bench Trial').
+    The mappings are indexed by their leading token. Of the matching mappings, the one with
+    the most tokens, then the most exact tokens, then the first in the YAML is the best one.
+    """
+    VERSION = 1
+    def __init__(self, odyssey_names: tuple):
+        # Leading token -> [(mapping key, tokens)]. The mapping key is the index in sessions_mapping.
+        self.mappings_by_token = {}
+        for mapping_key,odyssey_name in enumerate(odyssey_names):
+            tokens = self.tokenize(odyssey_name)
+            if tokens:
+                self.mappings_by_token.setdefault(tokens[0],[]).append((mapping_key,tokens))
+        # Identifies the compiled mappings in the cache of the classified descriptions.
+        self.fingerprint = hashlib.sha1(
+            '\n'.join([f"v{self.VERSION}"] + list(odyssey_names)).encode('utf-8')
+        ).hexdigest()
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def tokenize(text: str) -> list:
+        return text.replace('-','').upper().split()
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def _match(mapping_tokens: list, tokens: list, start: int) -> int:
+        """Returns the number of exact tokens if mapping_tokens match tokens from start on, else None."""
+        exact = 0
+        pos = start
+        for mapping_token in mapping_tokens:
+            while pos < len(tokens) and not tokens[pos].startswith(mapping_token):
+                pos += 1
+            if pos == len(tokens):
+                return None
+            exact += tokens[pos] == mapping_token
+            pos += 1
+        return exact
+    #--------------------------------------------------------------------------
+    def classify(self, description: str) -> int:
+        """Returns the mapping key of the best mapping of description, None if no mapping matches."""
+        if not description:
+            return None
+        tokens = self.tokenize(description)
+        best_key = None
+        best_score = None
+        for start,token in enumerate(tokens):
+            # The leading tokens the token starts with.
+            for length in range(1,len(token)+1):
+                for mapping_key,mapping_tokens in self.mappings_by_token.get(token[:length],()):
+                    exact = self._match(mapping_tokens,tokens,start)
+                    if exact is None:
+                        continue
+                    score = (len(mapping_tokens),exact,-mapping_key)
+                    if best_score is None or score > best_score:
+                        best_key = mapping_key
+                        best_score = score
+        return best_key
+#------------------------------------------------------------------------------
+class StyleRegistry:
+    """
+    Shared Font, PatternFill, Border and Alignment objects of a workbook, keyed by their
+    specification, so each distinct style is built once instead of once per cell.
+    style_array() also caches complete cell styles (StyleArray of style ids), so cells of
+    the same kind are styled by copying a small fixed set of arrays.
+    The ids are only valid for the workbook the registry was created for.
+    """
+    def __init__(self, wb: Workbook, yaml_config: dict):
+        self.wb = wb
+        self.yaml_config = yaml_config
+        self.colors = yaml_config['constants']['colors']
+        self._objects = {}
+        self._style_arrays = {}
+    #--------------------------------------------------------------------------
+    def _intern(self, key: tuple, build):
+        obj = self._objects.get(key)
+        if obj is None:
+            obj = self._objects[key] = build()
+        return obj
+    #--------------------------------------------------------------------------
+    def font(self, name=None, size=None, bold=None, italic=None, underline=None, strike=None, color=None) -> Font:
+        return self._intern(
+            ('font',name,size,bold,italic,underline,strike,color)
+            ,lambda: Font(name=name, size=size, bold=bold, italic=italic, underline=underline, strike=strike, color=color)
+        )
+    #--------------------------------------------------------------------------
+    def fill(self, start_color, end_color=None, fill_type: str='solid') -> PatternFill:
+        end_color = start_color if end_color is None else end_color
+        return self._intern(
+            ('fill',start_color,end_color,fill_type)
+            ,lambda: PatternFill(start_color=start_color, end_color=end_color, fill_type=fill_type)
+        )
+    #--------------------------------------------------------------------------
+    def border(self, left: tuple=(None,None), right: tuple=(None,None), top: tuple=(None,None), bottom: tuple=(None,None)) -> Border:
+        """Each side is a (style,color) tuple."""
+        return self._intern(
+            ('border',left,right,top,bottom)
+            ,lambda: Border(
+                left=Side(style=left[0], color=left[1])
+                ,right=Side(style=right[0], color=right[1])
+                ,top=Side(style=top[0], color=top[1])
+                ,bottom=Side(style=bottom[0], color=bottom[1])
+            )
+        )
+    #--------------------------------------------------------------------------
+    def alignment(self, horizontal: str, vertical: str, wrap_text: bool=True) -> Alignment:
+        return self._intern(
+            ('alignment',horizontal,vertical,wrap_text)
+            ,lambda: Alignment(horizontal=horizontal, vertical=vertical, wrapText=wrap_text)
+        )
+    #--------------------------------------------------------------------------
+    def font_spec(self, spec: dict) -> Font:
+        """Font of a YAML worksheet section 'font' specification."""
+        return self.font(
+            name=spec['name']
+            ,size=spec['size']
+            ,bold=spec['bold']
+            ,italic=spec['italic']
+            ,color=self.colors[spec['color']]
+        )
+    #--------------------------------------------------------------------------
+    def fill_spec(self, spec: dict) -> PatternFill:
+        """PatternFill of a YAML worksheet section 'fill' specification."""
+        return self.fill(self.colors[spec['start_color']], self.colors[spec['end_color']], spec['fill_type'])
+    #--------------------------------------------------------------------------
+    def border_spec(self, spec: dict, **side_styles) -> Border:
+        """
+        Border of a YAML worksheet section 'border' specification.
+        side_styles overrides the style of the given sides, e.g. bottom='thick'.
+        """
+        sides = {
+            side: (side_styles.get(side,spec[side]['style']), self.colors[spec[side]['color']])
+            for side in ('left','right','top','bottom')
+        }
+        return self.border(**sides)
+    #--------------------------------------------------------------------------
+    def imported_style(self, cell: Cell) -> StyleArray:
+        """
+        Returns the cell style (StyleArray) of this workbook for the style of a cell of
+        another workbook. The style objects are added to this workbook once per distinct style.
+        Assign a copy of it to a cell's _style.
+        """
+        return self.import_style(cell.parent.parent,cell._style)
+    #--------------------------------------------------------------------------
+    def import_style(self, source_wb, source_style: StyleArray, source_key=None) -> StyleArray:
+        """
+        Returns the cell style (StyleArray) of this workbook for source_style, a cell style of
+        source_wb: another workbook, or any object with the style lists of one (see MonthSheetPart).
+        Sources with the same source_key (default: the source_wb object) share their style ids.
+        """
+        source_key = id(source_wb) if source_key is None else source_key
+        key = ('imported',source_key,tuple(source_style))
+        style = self._style_arrays.get(key)
+        if style is None:
+            def import_object(list_name: str, source_id: int) -> int:
+                # Style objects are slow to hash, add each one once per source.
+                object_key = ('imported',source_key,list_name,source_id)
+                object_id = self._objects.get(object_key)
+                if object_id is None:
+                    object_id = self._objects[object_key] = getattr(self.wb,list_name).add(getattr(source_wb,list_name)[source_id])
+                return object_id
+            style = StyleArray()
+            style.fontId = import_object('_fonts',source_style.fontId)
+            style.fillId = import_object('_fills',source_style.fillId)
+            style.borderId = import_object('_borders',source_style.borderId)
+            style.alignmentId = import_object('_alignments',source_style.alignmentId)
+            style.protectionId = import_object('_protections',source_style.protectionId)
+            # Built-in number formats have fixed ids, the custom ones follow them.
+            if source_style.numFmtId < 164:
+                style.numFmtId = source_style.numFmtId
+            else:
+                style.numFmtId = self.wb._number_formats.add(source_wb._number_formats[source_style.numFmtId-164]) + 164
+            style.quotePrefix = source_style.quotePrefix
+            self._style_arrays[key] = style
+        return style
+    #--------------------------------------------------------------------------
+    def style_array(self, base: StyleArray=None, font: Font=None, fill: PatternFill=None, border: Border=None, alignment: Alignment=None) -> StyleArray:
+        """
+        Returns the cell style (StyleArray) of base with the given style objects replacing its own.
+        Assign a copy of it to a cell's _style.
+        """
+        base = base if base is not None else StyleArray()
+        key = (tuple(base),id(font),id(fill),id(border),id(alignment))
+        style = self._style_arrays.get(key)
+        if style is None:
+            style = copy.copy(base)
+            if font is not None:
+                style.fontId = self.wb._fonts.add(font)
+            if fill is not None:
+                style.fillId = self.wb._fills.add(fill)
+            if border is not None:
+                style.borderId = self.wb._borders.add(border)
+            if alignment is not None:
+                style.alignmentId = self.wb._alignments.add(alignment)
+            self._style_arrays[key] = style
+            # Keep the style objects alive so their ids stay unique in the key.
+            self._objects[('style_array',key)] = (font,fill,border,alignment)
+        return style
+#------------------------------------------------------------------------------
+class CellValueIndex:
+    """
+    Index of the rows holding the tracked values (placeholders, 'Empty' and month day numbers)
+    in each column of a worksheet.
+    Replaces scanning a column from the top for every lookup. Cell values, row insertions
+    and row deletions must go through the index so it stays in step with the worksheet.
+    If given, cell_colors ((row,col) -> ARGB color of the cell's court session) is kept
+    in step as well.
+    """
+    def __init__(self, ws: Worksheet, tracked_values: set, num_cols: int=5, cell_colors: dict=None):
+        self.ws = ws
+        self.tracked_values = tracked_values
+        self.num_cols = num_cols
+        self.cell_colors = cell_colors if cell_colors is not None else {}
+        # (column index, value) -> sorted list of row numbers.
+        self.rows = {}
+        for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=num_cols):
+            for cell in row:
+                if self.is_tracked(cell.value):
+                    self.rows.setdefault((cell.column,cell.value),[]).append(cell.row)
+    #--------------------------------------------------------------------------
+    def is_tracked(self, value) -> bool:
+        """Month day numbers and the tracked values are indexed."""
+        return isinstance(value,int) or isinstance(value,str) and value in self.tracked_values
+    #--------------------------------------------------------------------------
+    def find(self, column_idx: int, value, start_row: int=1) -> int:
+        """
+        Returns the first row number, at or below start_row, with the value in the given column.
+        Returns None if not found.
+        """
+        rows = self.rows.get((column_idx,value))
+        if rows:
+            i = bisect.bisect_left(rows,start_row)
+            if i < len(rows):
+                return rows[i]
+        return None
+    #--------------------------------------------------------------------------
+    def _remove(self, column_idx: int, value, row_num: int) -> None:
+        if self.is_tracked(value):
+            rows = self.rows[(column_idx,value)]
+            del rows[bisect.bisect_left(rows,row_num)]
+        return None
+    #--------------------------------------------------------------------------
+    def _add(self, column_idx: int, value, row_num: int) -> None:
+        if self.is_tracked(value):
+            bisect.insort(self.rows.setdefault((column_idx,value),[]),row_num)
+        return None
+    #--------------------------------------------------------------------------
+    def set_value(self, row_num: int, column_idx: int, value, color: str=None) -> None:
+        """Sets the cell value and the color it is to be shown in, if any."""
+        cell = self.ws.cell(row_num,column_idx)
+        self._remove(column_idx,cell.value,row_num)
+        cell.value = value
+        self._add(column_idx,value,row_num)
+        if color:
+            self.cell_colors[(row_num,column_idx)] = color
+        else:
+            self.cell_colors.pop((row_num,column_idx),None)
+        return None
+    #--------------------------------------------------------------------------
+    def copy_cell(self, source_cell: Cell, target_cell: Cell) -> None:
+        """Copies the value and styles of source_cell to target_cell."""
+        self._remove(target_cell.column,target_cell.value,target_cell.row)
+        copy_cell(source_cell,target_cell)
+        self._add(target_cell.column,target_cell.value,target_cell.row)
+        color = self.cell_colors.get((source_cell.row,source_cell.column))
+        if color:
+            self.cell_colors[(target_cell.row,target_cell.column)] = color
+        else:
+            self.cell_colors.pop((target_cell.row,target_cell.column),None)
+        return None
+    #--------------------------------------------------------------------------
+    def insert_rows(self, idx: int, amount: int=1) -> None:
+        """Inserts rows before idx, shifting the indexed rows at or below idx down."""
+        self.ws.insert_rows(idx,amount=amount)
+        for rows in self.rows.values():
+            i = bisect.bisect_left(rows,idx)
+            rows[i:] = [row + amount for row in rows[i:]]
+        shift_cell_colors(self.cell_colors,idx,amount)
+        return None
+    #--------------------------------------------------------------------------
+    def delete_rows(self, idx: int, amount: int=1) -> None:
+        """Deletes the rows idx..idx+amount-1, shifting the indexed rows below them up."""
+        self.ws.delete_rows(idx,amount=amount)
+        for rows in self.rows.values():
+            i = bisect.bisect_left(rows,idx)
+            j = bisect.bisect_left(rows,idx+amount)
+            rows[i:] = [row - amount for row in rows[j:]]
+        shift_cell_colors(self.cell_colors,idx,-amount)
+        return None
+#------------------------------------------------------------------------------
+class MergedCellIndex:
+    """
+    Index of the merged cells of a worksheet: (row,col) -> the MergedCellRange owning the cell.
+    Replaces 'cell.coordinate in ws.merged_cells', which parses the coordinate and tests
+    every merged range of the sheet. The index is a snapshot of the sheet's merged ranges:
+    build a new one after merging or unmerging cells.
+    """
+    def __init__(self, ws: Worksheet):
+        self.ws = ws
+        self.owners = {}
+        for range_obj in ws.merged_cells.ranges:
+            self._add(range_obj)
+    #--------------------------------------------------------------------------
+    def _add(self, range_obj: CellRange) -> None:
+        for row,col in range_obj.cells:
+            self.owners[(row,col)] = range_obj
+        return None
+    #--------------------------------------------------------------------------
+    def is_merged(self, row_num: int, column_idx: int) -> bool:
+        """Returns True if the cell is part of a merged range."""
+        return (row_num,column_idx) in self.owners
+#------------------------------------------------------------------------------
+class CourtSessionCache:
+    """
+    Local DuckDB cache of the court sessions fetched from Odyssey.
+    Entries are keyed by the stored procedure and its @pMonthOrYear parameter,
+    and expire ttl after they were fetched.
+    The delta sync keeps its own session store, by CourtSessionID, with a high-water mark per year.
+    Lookups open the file read-only. DuckDB locks the file for the process writing it (and
+    read-only processes lock out writers), so a run finding it locked by an overlapping run
+    retries with back-off, for up to lock_timeout seconds.
+    """
+    TABLES = {'cache_entry','session_store','sync_state','session_mapping_key','courtsession'}
+    # Columns of the court sessions tables.
+    SESSION_COLUMNS_DDL = ', '.join(f"{column} {'timestamp' if column == 'SessionDate' else 'varchar'}" for column in COURT_SESSION_COLUMNS)
+    def __init__(self, db_path: Path, ttl: timedelta, lock_timeout: float=60):
+        self.db_path = Path(db_path)
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        if self._has_schema():
+            return
+        with self._connect() as ddb_conn:
+            ddb_conn.sql("""
+                create table if not exists cache_entry (
+                    CacheKey varchar primary key
+                    ,FetchedAt timestamp
+                    ,Source varchar
+                );
+                create table if not exists session_store (
+                    CourtSessionID bigint
+                    ,ChangedAt timestamp
+                    ,Deleted boolean
+                    ,Included boolean
+                    ,SessionDate timestamp
+                    ,StartTime varchar
+                    ,SessionDescription varchar
+                    ,CalendarDescription varchar
+                    ,JudicialOfficerCode varchar
+                    ,JudicialOfficerDescription varchar
+                    ,CourtRoomCode varchar
+                    ,CourtRoomDescription varchar
+                );
+                create table if not exists sync_state (
+                    Year int primary key
+                    ,HighWaterMark timestamp
+                    ,SyncedAt timestamp
+                );
+                create table if not exists session_mapping_key (
+                    MappingFingerprint varchar
+                    ,SessionDescription varchar
+                    ,MappingKey int
+                    ,primary key (MappingFingerprint, SessionDescription)
+                );
+                create table if not exists courtsession (
+                    CacheKey varchar
+                    ,RowNum bigint
+                    ,SessionDate timestamp
+                    ,StartTime varchar
+                    ,SessionDescription varchar
+                    ,CalendarDescription varchar
+                    ,JudicialOfficerCode varchar
+                    ,JudicialOfficerDescription varchar
+                    ,CourtRoomCode varchar
+                    ,CourtRoomDescription varchar
+                );
+            """)
+    #--------------------------------------------------------------------------
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser) -> 'CourtSessionCache':
+        """The cache configured by the [Paths] cache_folder and [Cache] ttl_hours settings."""
+        cache_folder = config['Paths'].get('cache_folder','./.cache')
+        ttl_hours = config.getfloat('Cache','ttl_hours',fallback=12)
+        lock_timeout = config.getfloat('Cache','lock_timeout_seconds',fallback=60)
+        return cls(Path(cache_folder) / "court_sessions.duckdb",timedelta(hours=ttl_hours),lock_timeout)
+    #--------------------------------------------------------------------------
+    def _connect(self, read_only: bool=False) -> duckdb.DuckDBPyConnection:
+        """Returns a connection to the cache file, waiting while another run holds a conflicting lock on it."""
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.1
+        while True:
+            try:
+                return duckdb.connect(database=str(self.db_path),read_only=read_only)
+            except duckdb.IOException as e:
+                if 'lock' not in str(e).lower() or time.monotonic() + delay > deadline:
+                    raise
+                logger.info(f"Cache {self.db_path} is locked by another run, retrying in {delay:.1f}s.")
+                time.sleep(delay)
+                delay = min(delay*2,5)
+    #--------------------------------------------------------------------------
+    def _has_schema(self) -> bool:
+        """Returns True if the cache file exists with all its tables."""
+        if not self.db_path.is_file():
+            return False
+        with self._connect(read_only=True) as ddb_conn:
+            tables = {name for (name,) in ddb_conn.execute("select table_name from information_schema.tables").fetchall()}
+        return self.TABLES <= tables
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def key(month_or_year: int, query: str='procedure') -> str:
+        """Cache key of the [SQL] court_sessions_query (procedure or lean) for the @pMonthOrYear parameter."""
+        query_name = 'sp_getCourtSessionsByYear' if query == 'procedure' else f"qry_courtsessions_{query}"
+        return f"{query_name}:{month_or_year}"
+    #--------------------------------------------------------------------------
+    def entry(self, key: str, ignore_ttl: bool=False) -> 'CachedCourtSessions':
+        """Returns the cached court sessions of key, unread, None if not cached or expired."""
+        with self._connect(read_only=True) as ddb_conn:
+            entry = ddb_conn.execute(
+                "select FetchedAt, Source, (select count(*) from courtsession where CacheKey = ?) from cache_entry where CacheKey = ?"
+                ,(key,key)
+            ).fetchone()
+        if entry is None:
+            return None
+        fetched_at, source, num_rows = entry
+        if not ignore_ttl and datetime.now() - fetched_at > self.ttl:
+            logger.info(f"Cache entry {key} from {fetched_at:%Y-%m-%d %H:%M} has expired.")
+            return None
+        logger.info(f"Using {num_rows} cached court sessions of {key} from {source}, fetched {fetched_at:%Y-%m-%d %H:%M}.")
+        return CachedCourtSessions(self,key)
+    #--------------------------------------------------------------------------
+    def get(self, key: str, ignore_ttl: bool=False) -> DataFrame:
+        """Returns the cached court sessions, None if not cached or expired."""
+        cached_sessions = self.entry(key,ignore_ttl)
+        return cached_sessions.to_df() if cached_sessions is not None else None
+    #--------------------------------------------------------------------------
+    def put(self, key: str, df: DataFrame, source: str) -> None:
+        """Replaces the cached court sessions of key."""
+        self.put_batches(key,[df],source)
+        return None
+    #--------------------------------------------------------------------------
+    def put_batches(self, key: str, batches, source: str) -> int:
+        """
+        Replaces the cached court sessions of key with the DataFrames of batches. The batches are
+        appended to a staging DuckDB file of this process as they are produced, so the cache file
+        is only locked for the final swap, not for the whole fetch. Returns the number of rows.
+        """
+        num_rows = 0
+        staging_path = self.db_path.with_name(f"{self.db_path.stem}.{os.getpid()}.staging.duckdb")
+        try:
+            with duckdb.connect(database=str(staging_path)) as staging_conn:
+                staging_conn.execute(f"create or replace table courtsession (RowNum bigint, {self.SESSION_COLUMNS_DDL})")
+                for batch in batches:
+                    # RowNum is the fetch order.
+                    batch = batch.assign(RowNum=pd.RangeIndex(num_rows+1,num_rows+len(batch)+1))
+                    staging_conn.execute(f"insert into courtsession select RowNum, {', '.join(COURT_SESSION_COLUMNS)} from batch")
+                    num_rows += len(batch)
+            with self._connect() as ddb_conn:
+                ddb_conn.execute(f"attach '{str(staging_path).replace(chr(39),chr(39)*2)}' as staging (read_only)")
+                ddb_conn.begin()
+                ddb_conn.execute("delete from courtsession where CacheKey = ?",(key,))
+                ddb_conn.execute(f"""
+                    insert into courtsession
+                    select ?, RowNum, {', '.join(COURT_SESSION_COLUMNS)} from staging.courtsession
+                """,(key,))
+                ddb_conn.execute(
+                    "insert or replace into cache_entry values (?, ?, ?)"
+                    ,(key,datetime.now(),source)
+                )
+                ddb_conn.commit()
+                ddb_conn.execute("detach staging")
+        finally:
+            staging_path.unlink(missing_ok=True)
+            staging_path.with_name(staging_path.name + '.wal').unlink(missing_ok=True)
+        return num_rows
+    #--------------------------------------------------------------------------
+    def high_water_mark(self, year: int) -> datetime:
+        """Returns the latest Odyssey change synced into the session store for the year, None if never synced."""
+        with self._connect(read_only=True) as ddb_conn:
+            row = ddb_conn.execute("select HighWaterMark from sync_state where Year = ?",(year,)).fetchone()
+        return row[0] if row else None
+    #--------------------------------------------------------------------------
+    def upsert_changes(self, year: int, df: DataFrame) -> None:
+        """
+        Replaces the rows of the changed court sessions in the session store, deleted ones
+        included (tombstones), and advances the year's high-water mark.
+        """
+        with self._connect() as ddb_conn:
+            ddb_conn.begin()
+            ddb_conn.execute("delete from session_store where CourtSessionID in (select CourtSessionID from df)")
+            ddb_conn.execute(f"""
+                insert into session_store
+                select CourtSessionID, ChangedAt, Deleted, Included, {', '.join(COURT_SESSION_COLUMNS)} from df
+            """)
+            # The high-water mark only moves forward.
+            ddb_conn.execute("""
+                insert or replace into sync_state
+                select
+                    ?
+                    ,greatest(
+                        (select HighWaterMark from sync_state where Year = ?)
+                        ,(select max(ChangedAt) from df)
+                    )
+                    ,?
+            """,(year,year,datetime.now()))
+            ddb_conn.commit()
+        logger.info(f"Synced {len(df)} changed court session rows for {year}.")
+        return None
+    #--------------------------------------------------------------------------
+    def reset_sync(self, year: int) -> None:
+        """Drops the year's sessions and high-water mark from the session store, so the next sync is a full one."""
+        with self._connect() as ddb_conn:
+            ddb_conn.execute("delete from session_store where year(SessionDate) = ?",(year,))
+            ddb_conn.execute("delete from sync_state where Year = ?",(year,))
+        return None
+    #--------------------------------------------------------------------------
+    def store_sessions(self, year: int) -> DataFrame:
+        """Returns the year's court sessions of the session store, as sp_getCourtSessionsByYear does."""
+        with self._connect(read_only=True) as ddb_conn:
+            df = ddb_conn.execute(f"""
+                select distinct {', '.join(COURT_SESSION_COLUMNS)}
+                from session_store
+                where
+                    year(SessionDate) = ?
+                    and not Deleted
+                    and Included
+                -- Same order as the stored procedure, whose collation is case-insensitive.
+                order by SessionDate, StartTime, SessionDescription collate nocase, CalendarDescription collate nocase
+            """,(year,)).df()
+        return df
+    #--------------------------------------------------------------------------
+    def mapping_keys(self, fingerprint: str) -> dict:
+        """Returns the session description -> mapping key of the descriptions classified with the mappings of fingerprint."""
+        with self._connect(read_only=True) as ddb_conn:
+            rows = ddb_conn.execute(
+                "select SessionDescription, MappingKey from session_mapping_key where MappingFingerprint = ?"
+                ,(fingerprint,)
+            ).fetchall()
+        return dict(rows)
+    #--------------------------------------------------------------------------
+    def put_mapping_keys(self, fingerprint: str, mapping_keys: dict) -> None:
+        """Adds the session description -> mapping key (None if unmapped) classified with the mappings of fingerprint."""
+        with self._connect() as ddb_conn:
+            ddb_conn.executemany(
+                "insert or replace into session_mapping_key values (?, ?, ?)"
+                ,[(fingerprint,description,mapping_key) for description,mapping_key in mapping_keys.items()]
+            )
+        return None
+    #--------------------------------------------------------------------------
+    def invalidate(self, key: str=None) -> None:
+        """Removes the cache entry of key, or all entries if key is None."""
+        with self._connect() as ddb_conn:
+            if key is None:
+                ddb_conn.execute("delete from courtsession")
+                ddb_conn.execute("delete from cache_entry")
+            else:
+                ddb_conn.execute("delete from courtsession where CacheKey = ?",(key,))
+                ddb_conn.execute("delete from cache_entry where CacheKey = ?",(key,))
+        return None
+#------------------------------------------------------------------------------
+class CachedCourtSessions:
+    """
+    The court sessions of a CourtSessionCache entry, left in the cache file: read in chunks or
+    copied into another DuckDB database instead of loaded in one DataFrame.
+    """
+    def __init__(self, cache: CourtSessionCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.columns = COURT_SESSION_COLUMNS
+    #--------------------------------------------------------------------------
+    def _select(self) -> str:
+        return f"select {', '.join(self.columns)} from courtsession where CacheKey = ? order by RowNum"
+    #--------------------------------------------------------------------------
+    def iter_chunks(self, chunk_size: int=100_000):
+        """Yields the court sessions in DataFrames of about chunk_size rows."""
+        with self.cache._connect(read_only=True) as ddb_conn:
+            ddb_conn.execute(self._select(),(self.key,))
+            while len(chunk := ddb_conn.fetch_df_chunk(max(1,chunk_size // duckdb.__standard_vector_size__))):
+                yield chunk
+    #--------------------------------------------------------------------------
+    def to_df(self) -> DataFrame:
+        with self.cache._connect(read_only=True) as ddb_conn:
+            return ddb_conn.execute(self._select(),(self.key,)).df()
+    #--------------------------------------------------------------------------
+    def copy_to(self, ddb_conn: duckdb.DuckDBPyConnection, table_name: str) -> None:
+        """Creates the table table_name of the court sessions in ddb_conn's database, chunk by chunk."""
+        ddb_conn.execute(f"create or replace table {table_name} ({self.cache.SESSION_COLUMNS_DDL})")
+        for chunk in self.iter_chunks():
+            ddb_conn.execute(f"insert into {table_name} select {', '.join(self.columns)} from chunk")
+        return None
+#------------------------------------------------------------------------------
+class WorkbookCache:
+    """
+    Folder of finished workbooks named by the fingerprint of the run that built them
+    (see get_run_fingerprint()), so a run with the same inputs reuses the workbook instead
+    of building it again. Only the max_entries most recent workbooks are kept.
+    """
+    def __init__(self, folder: Path, max_entries: int=5):
+        self.folder = Path(folder)
+        self.max_entries = max_entries
+        self.folder.mkdir(parents=True,exist_ok=True)
+    #--------------------------------------------------------------------------
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser) -> 'WorkbookCache':
+        """The cache configured by the [Paths] cache_folder and [Cache] workbook_cache_size settings."""
+        cache_folder = config['Paths'].get('cache_folder','./.cache')
+        max_entries = config.getint('Cache','workbook_cache_size',fallback=5)
+        return cls(Path(cache_folder) / "workbooks",max_entries)
+    #--------------------------------------------------------------------------
+    def path(self, fingerprint: str) -> Path:
+        return self.folder / f"{fingerprint}.xlsx"
+    #--------------------------------------------------------------------------
+    def restore(self, fingerprint: str, workbook_name: str) -> bool:
+        """Copies the cached workbook of fingerprint to workbook_name. Returns False if not cached."""
+        cached_path = self.path(fingerprint)
+        if not cached_path.is_file():
+            return False
+        shutil.copyfile(cached_path,workbook_name)
+        cached_path.touch()
+        logger.info(f"Nothing changed since workbook {cached_path} was built, using it for: {workbook_name}")
+        return True
+    #--------------------------------------------------------------------------
+    def put(self, fingerprint: str, workbook_name: str) -> None:
+        """Stores a copy of workbook_name under fingerprint and drops the oldest workbooks."""
+        shutil.copyfile(workbook_name,self.path(fingerprint))
+        cached_paths = sorted(self.folder.glob("*.xlsx"),key=lambda path: path.stat().st_mtime,reverse=True)
+        for cached_path in cached_paths[self.max_entries:]:
+            cached_path.unlink()
+        return None
+#------------------------------------------------------------------------------
+class SkeletonCache:
+    """
+    Folder of pickled month sheets skeletons (see build_sheet_skeleton()) named by their
+    fingerprint (see get_skeleton_fingerprint()), so runs with the same YAML styling and year
+    load the skeleton instead of building it. Only the max_entries most recent are kept.
+    Unpickling runs code from the file, so a skeleton is only loaded if its header matches the
+    fingerprint and this script's code, and (on POSIX) if neither the skeletons folder (0700)
+    nor the file (0600) is owned or writable by another user. Do not share the cache folder.
+    """
+    def __init__(self, folder: Path, max_entries: int=5):
+        self.folder = Path(folder)
+        self.max_entries = max_entries
+        self.folder.mkdir(mode=0o700,parents=True,exist_ok=True)
+        # mkdir() leaves the mode of an existing folder as is.
+        if os.name == 'posix' and self.folder.stat().st_uid == os.getuid():
+            self.folder.chmod(0o700)
+    #--------------------------------------------------------------------------
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser) -> 'SkeletonCache':
+        """The cache configured by the [Paths] cache_folder and [Cache] skeleton_cache_size settings."""
+        cache_folder = config['Paths'].get('cache_folder','./.cache')
+        max_entries = config.getint('Cache','skeleton_cache_size',fallback=5)
+        return cls(Path(cache_folder) / "skeletons",max_entries)
+    #--------------------------------------------------------------------------
+    def path(self, fingerprint: str) -> Path:
+        return self.folder / f"{fingerprint}.pickle"
+    #--------------------------------------------------------------------------
+    def header(self, fingerprint: str) -> bytes:
+        """The line written before the pickle: the fingerprint and the SHA-256 of this script."""
+        script_sha256 = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+        return json.dumps({'fingerprint': fingerprint,'script_sha256': script_sha256}).encode('utf-8') + b'\n'
+    #--------------------------------------------------------------------------
+    def is_private(self, cached_path: Path) -> bool:
+        """False if the skeletons folder or cached_path is owned or writable by another user (POSIX only)."""
+        if os.name != 'posix':
+            return True
+        for path in (self.folder,cached_path):
+            path_stat = path.stat()
+            if path_stat.st_uid != os.getuid() or path_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                return False
+        return True
+    #--------------------------------------------------------------------------
+    def load(self, fingerprint: str) -> Workbook:
+        """
+        Returns a new copy of the cached skeleton of fingerprint, None if not cached, not
+        trusted (see the class docstring) or unreadable.
+        """
+        cached_path = self.path(fingerprint)
+        if not cached_path.is_file():
+            return None
+        if not self.is_private(cached_path):
+            logger.warning(f"Ignoring month sheets skeleton {cached_path}: the skeletons folder or file is owned or writable by other users.")
+            return None
+        try:
+            with open(cached_path,'rb') as f:
+                if f.readline() != self.header(fingerprint):
+                    logger.warning(f"Ignoring month sheets skeleton {cached_path}: its header does not match the fingerprint and script.")
+                    return None
+                wb = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable month sheets skeleton {cached_path}: {e}")
+            return None
+        restore_dimension_holders(wb)
+        cached_path.touch()
+        logger.info(f"Using the month sheets skeleton: {cached_path}")
+        return wb
+    #--------------------------------------------------------------------------
+    def put(self, fingerprint: str, wb: Workbook) -> None:
+        """Stores wb under fingerprint (mode 0600, whatever the umask) and drops the oldest skeletons."""
+        # mkstemp() creates the file 0600, the rename replaces the skeleton at once.
+        fd,temp_path = tempfile.mkstemp(suffix='.tmp',dir=self.folder)
+        try:
+            with os.fdopen(fd,'wb') as f:
+                f.write(self.header(fingerprint))
+                pickle.dump(wb,f,protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path,self.path(fingerprint))
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+        cached_paths = sorted(self.folder.glob("*.pickle"),key=lambda path: path.stat().st_mtime,reverse=True)
+        for cached_path in cached_paths[self.max_entries:]:
+            cached_path.unlink()
+        return None
+#------------------------------------------------------------------------------
+class PrerenderedSheetsWriter(ExcelWriter):
+    """
+    ExcelWriter that writes the worksheet XML of sheet_xml (by sheet title), rendered in worker
+    processes (see MonthSheetPart), instead of serializing those sheets of the workbook.
+    """
+    def __init__(self, workbook: Workbook, archive: zipfile.ZipFile, sheet_xml: dict=None):
+        super().__init__(workbook,archive)
+        self.sheet_xml = sheet_xml or {}
+    #--------------------------------------------------------------------------
+    def write_worksheet(self, ws) -> None:
+        xml = self.sheet_xml.get(ws.title)
+        if xml is None:
+            return super().write_worksheet(ws)
+        # No drawings or relationships, the month sheets have none.
+        ws._drawing = SpreadsheetDrawing()
+        ws._rels = RelationshipList()
+        self._archive.writestr(ws.path[1:],xml)
+        self.manifest.append(ws)
+        return None
+#------------------------------------------------------------------------------
+class XlsxPackager:
+    """
+    Saves workbooks like Workbook.save(), but deflates their XML parts on a thread pool (zlib
+    releases the GIL while it compresses) and writes the zip container itself.
+    compression_level is the zlib level, 0 (fastest, largest file) to 9 (slowest, smallest file).
+    With deterministic, the timestamps (zip entries and document properties) are fixed and the
+    parts are written in name order, so the same workbook gives a byte-identical file.
+    """
+    # Timestamp of the zip entries and document properties of deterministic files.
+    FIXED_DATETIME = datetime(1980,1,1)
+    # Zip file structures (no Zip64, the parts of a workbook stay far below 4 GB).
+    LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+    CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+    END_OF_CENTRAL_DIRECTORY = struct.Struct('<IHHHHIIH')
+    # Bytes read from a stored part per compressor call.
+    CHUNK_SIZE = 1 << 20
+    def __init__(self, compression_level: int=6, workers: int=0, deterministic: bool=False):
+        self.compression_level = compression_level
+        self.workers = workers or os.cpu_count() or 1
+        self.deterministic = deterministic
+    #--------------------------------------------------------------------------
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser, compression_level: int=None) -> 'XlsxPackager':
+        """The packager configured by the [Save] settings. compression_level overrides [Save] compression_level."""
+        if compression_level is None:
+            compression_level = config.getint('Save','compression_level',fallback=6)
+        workers = config.getint('Save','workers',fallback=0)
+        deterministic = config.getboolean('Save','deterministic',fallback=False)
+        return cls(compression_level,workers,deterministic)
+    #--------------------------------------------------------------------------
+    @property
+    def output_settings(self) -> str:
+        """The settings that change the saved file (workers only changes how fast it is saved)."""
+        return f"compression_level={self.compression_level}|deterministic={self.deterministic}"
+    #--------------------------------------------------------------------------
+    def _write_stored(self, wb: Workbook, f, sheet_xml: dict=None) -> None:
+        """
+        Writes wb, serialized by openpyxl, to the file object f as a stored (uncompressed) zip.
+        The sheets of sheet_xml are written from their XML (see PrerenderedSheetsWriter).
+        """
+        if wb.write_only and not wb.worksheets:
+            wb.create_sheet()
+        if self.deterministic:
+            wb.properties.created = self.FIXED_DATETIME
+            wb.properties.modified = self.FIXED_DATETIME
+        else:
+            wb.properties.modified = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        # Stored, the parts are deflated by save().
+        PrerenderedSheetsWriter(wb,zipfile.ZipFile(f,'w',zipfile.ZIP_STORED,allowZip64=True),sheet_xml).save()
+        return None
+    #--------------------------------------------------------------------------
+    def _deflate(self, archive: zipfile.ZipFile, name: str) -> tuple:
+        """Returns the name, CRC-32, size and raw deflate stream of the part name, read from archive in chunks."""
+        compressor = zlib.compressobj(self.compression_level,zlib.DEFLATED,-zlib.MAX_WBITS)
+        crc = size = 0
+        deflated = []
+        with archive.open(name) as part:
+            while chunk := part.read(self.CHUNK_SIZE):
+                crc = zlib.crc32(chunk,crc)
+                size += len(chunk)
+                deflated.append(compressor.compress(chunk))
+        deflated.append(compressor.flush())
+        return name,crc,size,b''.join(deflated)
+    #--------------------------------------------------------------------------
+    def _write_part(self, f, deflated_part: tuple, dos_time: int, dos_date: int) -> bytes:
+        """Writes the local header and data of a deflated part to f, returns its central directory entry."""
+        name,crc,size,deflated = deflated_part
+        offset = f.tell()
+        if offset + len(deflated) > 0xFFFFFFFF or size > 0xFFFFFFFF:
+            raise ValueError(f"Workbook part {name} is beyond the 4 GB zip limit, save it with Workbook.save().")
+        encoded_name = name.encode('utf-8')
+        f.write(self.LOCAL_HEADER.pack(
+            0x04034b50,20,0,zipfile.ZIP_DEFLATED,dos_time,dos_date
+            ,crc,len(deflated),size,len(encoded_name),0
+        ))
+        f.write(encoded_name)
+        f.write(deflated)
+        return self.CENTRAL_HEADER.pack(
+            0x02014b50,20,20,0,zipfile.ZIP_DEFLATED,dos_time,dos_date
+            ,crc,len(deflated),size,len(encoded_name),0,0,0,0,0,offset
+        ) + encoded_name
+    #--------------------------------------------------------------------------
+    def save(self, wb: Workbook, filename: str, sheet_xml: dict=None) -> None:
+        """
+        Serializes wb to a stored zip in a temporary file, then streams each part through its
+        compressor and writes it to filename as soon as it is deflated (in name order when
+        deterministic), at most workers parts are deflated at a time.
+        The sheets of sheet_xml (XML by sheet title) are written from their XML.
+        """
+        if self.deterministic:
+            timestamp = self.FIXED_DATETIME
+        else:
+            timestamp = datetime.now()
+        dos_time = (timestamp.hour << 11) | (timestamp.minute << 5) | (timestamp.second // 2)
+        dos_date = ((timestamp.year - 1980) << 9) | (timestamp.month << 5) | timestamp.day
+        central_directory = []
+        with tempfile.TemporaryFile() as stored_file:
+            self._write_stored(wb,stored_file,sheet_xml)
+            with zipfile.ZipFile(stored_file) as archive, ThreadPoolExecutor(max_workers=self.workers) as executor, open(filename,'wb') as f:
+                names = archive.namelist()
+                if self.deterministic:
+                    names.sort()
+                pending = []
+                for index,name in enumerate(names):
+                    pending.append(executor.submit(self._deflate,archive,name))
+                    while pending and (len(pending) >= self.workers or index == len(names) - 1):
+                        if self.deterministic:
+                            done = [pending[0]]
+                        else:
+                            done = wait(pending,return_when=FIRST_COMPLETED).done
+                        for future in done:
+                            central_directory.append(self._write_part(f,future.result(),dos_time,dos_date))
+                        pending = [future for future in pending if future not in done]
+                central_directory_offset = f.tell()
+                f.write(b''.join(central_directory))
+                f.write(self.END_OF_CENTRAL_DIRECTORY.pack(
+                    0x06054b50,0,0,len(names),len(names)
+                    ,f.tell() - central_directory_offset,central_directory_offset,0
+                ))
+        return None
+#------------------------------------------------------------------------------
+class CalendarDimension:
+    """
+    The days of a calendar year with their date attributes, computed once and shared by the
+    DuckDB queries (as the calendar_day table) and the layout stages.
+    The attributes are lists indexed by the day of the year (0 = January 1st):
+        dates           date
+        month, day      month and month day
+        weekday         ISO weekday (1=Monday, 7=Sunday)
+        week            '%U' week number. Weeks start on Sunday and the days before the year's
+                        first Sunday are week 0, so a week spanning the new year is (year,52|53)
+                        for its December days and (year+1,0) for its January days.
+        week_of_month   row block of the day on its month sheet: the month's weeks (Monday to
+                        Sunday) having a workday in the month, counted from 0
+        workday         Monday to Friday
+        column          column index of the day on its month sheet, None on weekends
+    month_start[month] is the day of the year of the month's first day, month_num_days[month]
+    its number of days and month_weeks[month] its row blocks: the month days, or None, of
+    the Monday to Friday columns.
+    """
+    NUM_COLS = 5
+    def __init__(self, year: int):
+        self.year = year
+        self.dates = list(date_range_generator(date(year,1,1),date(year,12,31)))
+        self.month = [dt.month for dt in self.dates]
+        self.day = [dt.day for dt in self.dates]
+        self.weekday = [dt.isoweekday() for dt in self.dates]
+        self.week = [int(dt.strftime("%U")) for dt in self.dates]
+        self.workday = [weekday <= self.NUM_COLS for weekday in self.weekday]
+        self.column = [weekday if workday else None for weekday,workday in zip(self.weekday,self.workday)]
+        self.week_of_month = [0] * len(self.dates)
+        self.month_start = {}
+        self.month_num_days = {}
+        self.month_weeks = {}
+        for day_of_year,dt in enumerate(self.dates):
+            month = dt.month
+            if dt.day == 1:
+                self.month_start[month] = day_of_year
+                self.month_num_days[month] = 0
+                self.month_weeks[month] = []
+            self.month_num_days[month] += 1
+            month_weeks = self.month_weeks[month]
+            if self.workday[day_of_year]:
+                # A new row block on the month's first workday and on each Monday after it.
+                if not month_weeks or self.weekday[day_of_year] == 1:
+                    month_weeks.append([None] * self.NUM_COLS)
+                month_weeks[-1][self.column[day_of_year]-1] = dt.day
+            self.week_of_month[day_of_year] = max(len(month_weeks) - 1,0)
+    #--------------------------------------------------------------------------
+    def day_of_year(self, month: int, day: int) -> int:
+        """Returns the index of the month day in the attribute lists."""
+        return self.month_start[month] + day - 1
+    #--------------------------------------------------------------------------
+    def to_df(self) -> DataFrame:
+        """Returns the days as the rows of the calendar_day table."""
+        return DataFrame({
+            'Date': self.dates
+            ,'Year': self.year
+            ,'Month': self.month
+            ,'Day': self.day
+            ,'Weekday': self.weekday
+            ,'Week': self.week
+            ,'WeekOfMonth': self.week_of_month
+            ,'Workday': self.workday
+            ,'ColumnIdx': self.column
+        })
+#------------------------------------------------------------------------------
+class CourtSessionIndex:
+    """
+    The calendar's court sessions, as built by convert_df_to_list(), indexed by date.
+    Each session is a list:
+        [SessionDate,StartTime,SessionDescription,Color,JudicialOfficerCode,DisplayOrder,week,row_num]
+    Iterating the index gives the sessions in display order.
+    """
+    def __init__(self):
+        self.sessions = []
+        self.by_date = {}
+    #--------------------------------------------------------------------------
+    def __iter__(self):
+        return iter(self.sessions)
+    #--------------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.sessions)
+    #--------------------------------------------------------------------------
+    def append(self, session: list) -> None:
+        self.sessions.append(session)
+        self.by_date.setdefault(session[0],[]).append(session)
+        return None
+    #--------------------------------------------------------------------------
+    def day_sessions(self, dt: date) -> list:
+        """Returns the sessions of the date, in display order."""
+        return self.by_date.get(dt,[])
+    #--------------------------------------------------------------------------
+    def month_slice(self, year: int, month: int) -> 'CourtSessionIndex':
+        """Returns the index of the sessions of the month's days, all a month sheet needs."""
+        month_sessions = CourtSessionIndex()
+        for session in self.sessions:
+            if session[0].year == year and session[0].month == month:
+                month_sessions.append(session)
+        return month_sessions
+#------------------------------------------------------------------------------
+class GridCell:
+    """
+    One cell of a CalendarGrid.
+    kind selects how the cell is styled when written to the sheet:
+        workday         month day number (workday template style)
+        workday_empty   'Empty' month day cell, font color hidden in the fill color
+        court_session   blank court session cell (court_session template style)
+        session         timed court session, font in the session's color
+        spanning        spanning session/special date, filled with the session's color
+        last_row        the bottom border row
+    merge_end_col is set on the first cell of a horizontal merge and merged is set on
+    every cell of the merge.
+    """
+    __slots__ = ('value','kind','color','merge_end_col','merged')
+    def __init__(self, value=None, kind: str='court_session', color: str=None):
+        self.value = value
+        self.kind = kind
+        self.color = color
+        self.merge_end_col = None
+        self.merged = False
+    def is_empty(self) -> bool:
+        return not self.value
+#------------------------------------------------------------------------------
+class CalendarGrid:
+    """
+    Pure-Python layout of the month day and court session rows of one month sheet.
+    The layout is the same as the one built by inserting, deleting, merging and swapping
+    cells of the worksheet, but it is computed on lists and written to the sheet in one pass.
+    rows[0] is the first week's month day row, which is on sheet row first_row.
+    """
+    def __init__(self, calendar_year: int, month: int, court_sessions: CourtSessionIndex, yaml_config: dict, first_row: int=6):
+        self.calendar_year = calendar_year
+        self.month = month
+        self.first_row = first_row
+        self.num_cols = 5
+        self.yaml_config = yaml_config
+        self.court_sessions = court_sessions
+        self.rows: List[List[GridCell]] = []
+        self._add_weeks()
+        self._remove_blank_rows()
+        # Add the row used for the bottom border.
+        self.rows.append([GridCell(kind='last_row') for _ in range(self.num_cols)])
+        self._merge_runs()
+        self._compact_columns()
+        self._remove_empty_rows()
+    #--------------------------------------------------------------------------
+    def _session_cell(self, session: list) -> GridCell:
+        """
+        Returns the cell for a court session.
+        Sessions starting with a time get the color as the font color,
+        all others (spanning sessions and special dates) get the color as the fill.
+        """
+        session_description, color_name = session[2],session[3]
+        if not session_description:
+            return GridCell(session_description)
+        color = get_yaml_config_color(self.yaml_config,color_name if color_name else 'Black')
+        kind = 'session' if session_description[0] in "1234567890" else 'spanning'
+        return GridCell(session_description,kind,color)
+    #--------------------------------------------------------------------------
+    def _add_weeks(self) -> None:
+        """
+        Adds a block of rows for each week of the month: the month day row followed by
+        one row per court session of the busiest day and a trailing empty row.
+        """
+        calendar_dimension = get_calendar_dimension(self.calendar_year)
+        for week_days in calendar_dimension.month_weeks[self.month]:
+            # Month day row. Workdays not in the month are 'Empty'.
+            day_row = []
+            week_day_sessions = []
+            for day in week_days:
+                if day is not None:
+                    day_row.append(GridCell(day,'workday'))
+                    week_day_sessions.append(self.court_sessions.day_sessions(
+                        calendar_dimension.dates[calendar_dimension.day_of_year(self.month,day)]
+                    ))
+                else:
+                    day_row.append(GridCell('Empty','workday_empty'))
+                    week_day_sessions.append([])
+            self.rows.append(day_row)
+            # Court session rows.
+            num_session_rows = max(len(sessions) for sessions in week_day_sessions) + 1
+            for i in range(num_session_rows):
+                self.rows.append([
+                    self._session_cell(sessions[i]) if i < len(sessions) else GridCell()
+                    for sessions in week_day_sessions
+                ])
+        return None
+    #--------------------------------------------------------------------------
+    def _remove_blank_rows(self) -> None:
+        """Removes the rows where all cells are empty."""
+        self.rows = [row for row in self.rows if not all(cell.is_empty() for cell in row)]
+        return None
+    #--------------------------------------------------------------------------
+    def _merge_runs(self) -> None:
+        """
+        For each session row, merge adjacent cells having the same session (and color).
+        Month days, 'Empty' and timed sessions (starting with a number) are not merged.
+        """
+        for row in self.rows[1:]:
+            first_col_in_merge = None
+            last_col_in_merge = None
+            for col in range(1,self.num_cols):
+                cell, prev_cell = row[col], row[col-1]
+                same_as_prev = cell.value == prev_cell.value and cell.color == prev_cell.color
+                if (
+                        cell.value
+                        and cell.value != "Empty"
+                        and str(cell.value)[0] not in "1234567890"
+                        and same_as_prev
+                    ):
+                    if first_col_in_merge is None:
+                        first_col_in_merge = col-1
+                    last_col_in_merge = col
+                if col == self.num_cols-1 or cell.value and not same_as_prev:
+                    if first_col_in_merge is not None and last_col_in_merge is not None:
+                        row[first_col_in_merge].merge_end_col = last_col_in_merge
+                        for merged_col in range(first_col_in_merge,last_col_in_merge+1):
+                            row[merged_col].merged = True
+                        first_col_in_merge = None
+                        last_col_in_merge = None
+        return None
+    #--------------------------------------------------------------------------
+    def _compact_columns(self) -> None:
+        """
+        In each column, move the non-empty session cells up into the empty cells above them.
+        Month day numbers and merged cells are not moved and bound the cells that are moved.
+        'Empty' month days stay where they are.
+        """
+        for col in range(self.num_cols):
+            segment = [] # Row indexes of the movable cells between two bounding cells.
+            for row_idx in range(len(self.rows)+1):
+                cell = self.rows[row_idx][col] if row_idx < len(self.rows) else None
+                if cell is None or cell.merged or isinstance(cell.value,int):
+                    # End of segment. Non-empty cells first, in their current order.
+                    cells = empties_last([self.rows[r][col] for r in segment],GridCell.is_empty)
+                    for r,c in zip(segment,cells):
+                        self.rows[r][col] = c
+                    segment = []
+                elif cell.value != "Empty":
+                    segment.append(row_idx)
+        return None
+    #--------------------------------------------------------------------------
+    def _remove_empty_rows(self) -> None:
+        """Removes the rows, other than the bottom border row, where all cells are empty and not merged."""
+        self.rows = [
+            row for row in self.rows[:-1]
+            if not all(cell.is_empty() and not cell.merged for cell in row)
+        ] + self.rows[-1:]
+        return None
+#------------------------------------------------------------------------------
+#------------------------------------------------------------------------------
+class GridCellStyles:
+    """
+    The cell styles (StyleArray) of the kinds of GridCell on a month sheet, based on the
+    sheet's workday and court_session template rows (the grid's first row and the row below it).
+    """
+    def __init__(self, ws: Worksheet, first_row: int, styles: StyleRegistry):
+        self.styles = styles
+        # Template styles.
+        workday_template = ws.cell(first_row,1)
+        court_session_template = ws.cell(first_row+1,1)
+        self.workday_style = copy.copy(workday_template._style)
+        self.court_session_style = copy.copy(court_session_template._style)
+        # Define font used to hide 'Empty', same color as the fill.
+        font = workday_template.font
+        self.workday_empty_style = styles.style_array(
+            self.workday_style
+            ,font=styles.font(
+                name=font.name
+                ,size=font.size
+                ,bold=font.bold
+                ,italic=font.italic
+                ,underline=font.underline
+                ,strike=font.strike
+                ,color=workday_template.fill.fgColor.rgb
+            )
+        )
+        # Define border of the last row.
+        self.last_row_style = styles.style_array(
+            border=styles.border_spec(styles.yaml_config['worksheet']['court_session']['border'], bottom='thick')
+        )
+        self.font = font = court_session_template.font
+        border = court_session_template.border
+        self.spanning_font = styles.font(
+            name=font.name
+            ,size=10
+            ,bold=True
+            ,italic=font.italic
+            ,underline=font.underline
+            ,strike=font.strike
+            ,color=None
+        )
+        self.spanning_alignment = styles.alignment('center', 'center')
+        self.spanning_border = styles.border(
+            left=('thick',border.left.color)
+            ,right=('thick',border.right.color)
+            ,top=('thick',border.top.color)
+            ,bottom=('thick',border.bottom.color)
+        )
+    #--------------------------------------------------------------------------
+    def style(self, grid_cell: GridCell) -> StyleArray:
+        """Returns the StyleArray of the cell. Assign a copy of it to a cell's _style."""
+        styles = self.styles
+        font = self.font
+        if grid_cell.kind == 'workday':
+            return self.workday_style
+        elif grid_cell.kind == 'workday_empty':
+            return self.workday_empty_style
+        elif grid_cell.kind == 'last_row':
+            return self.last_row_style
+        elif grid_cell.kind == 'session':
+            return styles.style_array(
+                self.court_session_style
+                ,font=styles.font(
+                    name=font.name
+                    ,size=font.size
+                    ,bold=font.bold
+                    ,italic=font.italic
+                    ,underline=font.underline
+                    ,strike=font.strike
+                    ,color=grid_cell.color
+                )
+            )
+        elif grid_cell.kind == 'spanning':
+            return styles.style_array(
+                self.court_session_style
+                ,font=self.spanning_font
+                ,fill=styles.fill(grid_cell.color)
+                ,border=self.spanning_border
+                ,alignment=self.spanning_alignment
+            )
+        return self.court_session_style
+#------------------------------------------------------------------------------
+class StreamingWorkbookWriter:
+    """
+    Writes month sheets to a write-only workbook (wb), streaming their rows instead of holding
+    all their cells in memory until the workbook is saved.
+    A grid row is first written to a scratch worksheet of the template workbook with the same
+    code as write_calendar_grid() (styles, merges and the borders the merges copy), then its
+    cells are streamed to the output sheet. Only one row of cells is held at a time.
+    """
+    def __init__(self, template_wb: Workbook, styles: StyleRegistry):
+        self.template_wb = template_wb
+        self.styles = styles
+        self.wb = Workbook(write_only=True)
+        # Styles of the output workbook.
+        self.output_styles = StyleRegistry(self.wb,styles.yaml_config)
+        # Not one of the template workbook's sheets.
+        self.scratch_ws = Worksheet(template_wb,title='scratch')
+    #--------------------------------------------------------------------------
+    def _create_sheet(self, source_ws: Worksheet):
+        """Returns a new output sheet with the title and column widths of source_ws."""
+        ws = self.wb.create_sheet(source_ws.title)
+        for column_letter,column_dimension in source_ws.column_dimensions.items():
+            ws.column_dimensions[column_letter].width = column_dimension.width
+        return ws
+    #--------------------------------------------------------------------------
+    def _append_row(self, ws, source_ws: Worksheet, row_num: int, num_cols: int) -> None:
+        """Appends the cells of row_num of source_ws, a worksheet of any workbook, to the output sheet ws."""
+        row_dimension = source_ws.row_dimensions.get(row_num)
+        if row_dimension is not None and row_dimension.height is not None:
+            ws.row_dimensions[row_num].height = row_dimension.height
+        row = []
+        for column_idx in range(1,num_cols+1):
+            source_cell = source_ws._cells.get((row_num,column_idx))
+            if source_cell is None:
+                row.append(None)
+                continue
+            cell = WriteOnlyCell(ws,value=None if isinstance(source_cell,MergedCell) else source_cell.value)
+            cell._style = copy.copy(self.output_styles.imported_style(source_cell))
+            row.append(cell)
+        ws.append(row)
+        return None
+    #--------------------------------------------------------------------------
+    def _write_header(self, ws, template_ws: Worksheet, first_row: int, num_cols: int) -> None:
+        """Streams the rows and merges of template_ws above first_row to the output sheet ws."""
+        for row_num in range(1,first_row):
+            self._append_row(ws,template_ws,row_num,num_cols)
+        for merged_range in template_ws.merged_cells.ranges:
+            if merged_range.max_row < first_row:
+                ws.merged_cells.add(merged_range.coord)
+        return None
+    #--------------------------------------------------------------------------
+    def copy_sheet(self, template_ws: Worksheet, source_ws: Worksheet, first_row: int=6) -> None:
+        """
+        Streams the month sheet of template_ws with the rows and merges of source_ws, a sheet of
+        another workbook, from first_row on (see copy_sheet_contents()) to a new output sheet.
+        """
+        ws = self._create_sheet(template_ws)
+        num_cols = max(template_ws.max_column,source_ws.max_column)
+        self._write_header(ws,template_ws,first_row,num_cols)
+        for row_num in range(first_row,source_ws.max_row+1):
+            self._append_row(ws,source_ws,row_num,num_cols)
+        for merged_range in source_ws.merged_cells.ranges:
+            if merged_range.min_row >= first_row:
+                ws.merged_cells.add(merged_range.coord)
+        return None
+    #--------------------------------------------------------------------------
+    def write_month(self, template_ws: Worksheet, grid: CalendarGrid) -> None:
+        """
+        Streams the month sheet of template_ws with the grid to a new output sheet:
+        the template rows above the grid, then the grid rows.
+        """
+        ws = self._create_sheet(template_ws)
+        num_cols = max(template_ws.max_column,grid.num_cols)
+        self._write_header(ws,template_ws,grid.first_row,num_cols)
+        cell_styles = GridCellStyles(template_ws,grid.first_row,self.styles)
+        scratch_ws = self.scratch_ws
+        for row_idx,row in enumerate(grid.rows):
+            row_num = grid.first_row + row_idx
+            # The template's cells of the row, if any, as write_calendar_grid() writes over them.
+            scratch_ws._cells.clear()
+            scratch_ws.merged_cells.ranges = set()
+            for column_idx in range(1,num_cols+1):
+                template_cell = template_ws._cells.get((row_num,column_idx))
+                if template_cell is not None:
+                    cell = scratch_ws.cell(row_num,column_idx)
+                    cell.value = template_cell.value
+                    cell._style = copy.copy(template_cell._style)
+            write_grid_row(scratch_ws,row_num,row,cell_styles)
+            self._append_row(ws,scratch_ws,row_num,num_cols)
+            for merged_range in scratch_ws.merged_cells.ranges:
+                ws.merged_cells.add(merged_range.coord)
+        return None
+#------------------------------------------------------------------------------
+class MonthSheetPart:
+    """
+    A month sheet rendered in a worker process (see render_month_sheet_part()): the worksheet
+    XML of the sheet and the style lists of the worker's workbook, which its style ids refer to.
+    xml_for() gives the XML with the style ids of the workbook the part is saved in.
+    The parts of a worker share its workbook, so their style ids are imported once per worker.
+    """
+    # Style lists of a workbook, the cell styles and the style objects they refer to.
+    STYLE_LISTS = ('_cell_styles','_fonts','_fills','_borders','_alignments','_protections','_number_formats')
+    # Style ids of the cells (c), rows and columns (col) of worksheet XML.
+    STYLE_ID = re.compile(rb'(<(?:c|row)\b[^>]*?\ss="|<col\b[^>]*?\sstyle=")(\d+)"')
+    def __init__(self, month: int, xml: bytes, wb: Workbook):
+        self.month = month
+        self.xml = xml
+        self.worker = os.getpid()
+        for name in self.STYLE_LISTS:
+            setattr(self,name,getattr(wb,name))
+    #--------------------------------------------------------------------------
+    def xml_for(self, styles: StyleRegistry) -> bytes:
+        """Returns the XML of the sheet with the style ids of the workbook of styles, adding its styles there."""
+        cell_styles = styles.wb._cell_styles
+        style_ids = {}
+        def replace_style_id(match: re.Match) -> bytes:
+            source_id = int(match[2])
+            style_id = style_ids.get(source_id)
+            if style_id is None:
+                style_id = style_ids[source_id] = cell_styles.add(
+                    styles.import_style(self,self._cell_styles[source_id],source_key=('worker',self.worker))
+                )
+            return match[1] + str(style_id).encode('ascii') + b'"'
+        return self.STYLE_ID.sub(replace_style_id,self.xml)
 #==============================================================================
 # Functions
 #==============================================================================
@@ -97,7 +1480,7 @@ def read_yaml_configuration(yamlFilename: str) -> configparser:
     """
     ymldata = None
     with open(yamlFilename, 'r') as file:
-        ymldata = yaml.safe_load(file)
+        ymldata = yaml.load(file, Loader=DuplicateKeySafeLoader)
     return(ymldata)
 # ------------------------------------------------------------------------------------------------+
 def get_yaml_config_color(yaml_conf: configparser, color_name: str) -> str:
@@ -122,44 +1505,23 @@ def get_date_range(start_date: date, end_date: date):
         current_date += timedelta(days=1)
     return date_list
 #--------------------------------------------------------------------------------------------------
-def find_first_matching_cell(worksheet: Worksheet, column_letter: str, text: str) -> int:
-    """
-    Finds the first row index (1-based) with the given text in the given column.
-    Returns the row number of the matching cell or None.
-    """
-    for row_num in range(1,worksheet.max_row+2):
-        cell = worksheet[f'{column_letter}{row_num}']
-        if cell.value == text or cell.value is None and (text == '' or text is None): #if cell.value == text:
-            return row_num
-    logger.debug(f"No empty cell found in column {column_letter} up to row {worksheet.max_row + 1}.")
-    return None
-#--------------------------------------------------------------------------------------------------
-def find_first_matching_cell_by_col_idx(worksheet: Worksheet, column_idx: int, text: str,start_row: int = 1) -> int:
+@functools.lru_cache(maxsize=8)
+def get_calendar_dimension(year: int) -> CalendarDimension:
     """
-    Finds the first row index (1-based) with the given text in the given column.
-    Returns the row number of the matching cell or None.
+    Returns the CalendarDimension of the year.
+    Cached, so each year's days are computed once.
     """
-    for row_num in range(start_row,worksheet.max_row+2):
-        cell = worksheet.cell(row_num,column_idx)
-        if cell.value == text or cell.value is None and (text == '' or text is None): #if cell.value == text:
-            return row_num
-    logger.debug(f"Cell with value '{text}' not found in column index {column_idx} up to row {worksheet.max_row + 1}.")
-    return None
+    return CalendarDimension(year)
 #--------------------------------------------------------------------------------------------------
-def get_weekday_number(year: int, month: int, day: int):
-    """
-    Returns the weekday as an integer (1=Monday, 5=Sunday).
-    """
-    try:
-        # Create a date object
-        d = date(year, month, day)
-        
-        # Use the .weekday() method
-        return d.isoweekday()
-    except ValueError as e:
-        # Handles errors like an invalid date (e.g., February 30th)
-        logger.exception(f"Error creating date: {year}-{month}-{day}, {e}")
-        return None
+def get_calendar_day_df(years) -> DataFrame:
+    """Returns the calendar_day rows of the years from the first to the last of years."""
+    years = [int(year) for year in years]
+    if not years:
+        return get_calendar_dimension(date.today().year).to_df().head(0)
+    return pd.concat(
+        [get_calendar_dimension(year).to_df() for year in range(min(years),max(years)+1)]
+        ,ignore_index=True
+    )
 #--------------------------------------------------------------------------------------------------
 def copy_cell(source_cell: Cell, target_cell: Cell) -> None:
     """
@@ -167,51 +1529,56 @@ def copy_cell(source_cell: Cell, target_cell: Cell) -> None:
     """
     # 1. Copy Value/Formula
     target_cell.value = source_cell.value
-    # 2. Copy Styles (using copy() to get an independent object)
-    # Check if the source style object exists before trying to copy it.
-    target_cell.font = copy.copy(source_cell.font) if source_cell.font else None
-    target_cell.border = copy.copy(source_cell.border) if source_cell.border else None
-    target_cell.fill = copy.copy(source_cell.fill) if source_cell.fill else None
-    target_cell.alignment = copy.copy(source_cell.alignment) if source_cell.alignment else None
-    # Number format and protection are simpler assignments
-    target_cell.number_format = source_cell.number_format
-    target_cell.protection = copy.copy(source_cell.protection) if source_cell.protection else None
+    # 2. Copy Styles
+    # A cell's styles are held in its StyleArray as ids into the workbook's shared style tables.
+    # Copying the array gives the target its own ids, so later changes to either cell's
+    # font/fill/border cannot leak into the other, and no style objects are allocated.
+    target_cell._style = copy.copy(source_cell._style)
     return None
 #--------------------------------------------------------------------------------------------------
-def swap_cells(ws: Worksheet, coord1: str, coord2: str) -> None:
-    cell1 = ws[coord1]
-    cell2 = ws[coord2]
-    # --- 1. Store the full contents of Cell 1 in a temporary structure ---
-    # Core values
-    temp_value = cell1.value
-    temp_data_type = cell1.data_type
-    temp_number_format = cell1.number_format
-    # Styles (using copy.copy() to follow modern openpyxl practice)
-    temp_font = copy.copy(cell1.font) if cell1.font else None
-    temp_border = copy.copy(cell1.border) if cell1.border else None
-    temp_fill = copy.copy(cell1.fill) if cell1.fill else None
-    temp_alignment = copy.copy(cell1.alignment) if cell1.alignment else None
-    temp_protection = copy.copy(cell1.protection) if cell1.protection else None
-    # --- 2. Copy Cell 2's contents to Cell 1 ---
-    # (Using copy.copy() on cell2's objects)
-    cell1.value = cell2.value
-    cell1.data_type = cell2.data_type
-    cell1.number_format = cell2.number_format
-    cell1.font = copy.copy(cell2.font) if cell2.font else None
-    cell1.border = copy.copy(cell2.border) if cell2.border else None
-    cell1.fill = copy.copy(cell2.fill) if cell2.fill else None
-    cell1.alignment = copy.copy(cell2.alignment) if cell2.alignment else None
-    cell1.protection = copy.copy(cell2.protection) if cell2.protection else None
-    # --- 3. Copy Temp contents (Cell 1's original) to Cell 2 ---
-    # (Direct assignment of the pre-copied temp objects)
-    cell2.value = temp_value
-    cell2.data_type = temp_data_type
-    cell2.number_format = temp_number_format
-    cell2.font = temp_font
-    cell2.border = temp_border
-    cell2.fill = temp_fill
-    cell2.alignment = temp_alignment
-    cell2.protection = temp_protection
+def empties_last(items: list, is_empty) -> list:
+    """Returns the items with the non-empty ones first, each group kept in its original order."""
+    return [item for item in items if not is_empty(item)] + [item for item in items if is_empty(item)]
+#--------------------------------------------------------------------------------------------------
+def compact_column(ws: Worksheet, column_idx: int, merged_index: MergedCellIndex) -> None:
+    """
+    In the column, move the non-empty session cells up into the empty cells above them,
+    value and style together, in one pass.
+    Month day numbers and merged cells are not moved and bound the cells that are moved.
+    'Empty' month days stay where they are.
+    """
+    max_row = ws.max_row
+    segment = [] # The movable cells between two bounding cells.
+    for row in range(1,max_row+2):
+        cell = ws.cell(row,column_idx) if row <= max_row else None
+        if cell is None or merged_index.is_merged(row,column_idx) or isinstance(cell.value,int):
+            # End of segment. Write the cells in their final order.
+            contents = empties_last([(c.value,c._style) for c in segment],lambda content: not content[0])
+            for target,(value,style) in zip(segment,contents):
+                if target.value is not value or target._style is not style:
+                    target.value = value
+                    target._style = style
+            segment = []
+        elif cell.value != "Empty":
+            segment.append(cell)
+    return None
+#--------------------------------------------------------------------------------------------------
+def shift_cell_colors(cell_colors: dict, idx: int, amount: int) -> None:
+    """
+    Shifts the (row,col) keys of cell_colors for rows inserted (amount > 0) before idx
+    or deleted (amount < 0) from idx on, as worksheet insert_rows/delete_rows do to the cells.
+    """
+    shifted = {}
+    for (row,col),color in cell_colors.items():
+        if row < idx:
+            shifted[(row,col)] = color
+        elif amount > 0:
+            shifted[(row+amount,col)] = color
+        elif row >= idx-amount:
+            shifted[(row+amount,col)] = color
+        # Else the row is deleted.
+    cell_colors.clear()
+    cell_colors.update(shifted)
     return None
 #--------------------------------------------------------------------------------------------------
 def shift_merges_after_delete_old(ws: Worksheet, deleted_row_idx: int, amount: int=1) -> None:
@@ -260,87 +1627,209 @@ def unmerge_cells(ws: Worksheet) -> List[MergedCellRange]:
         ws.unmerge_cells(str(range_obj))
     return all_merges
 #--------------------------------------------------------------------------------------------------
-def shift_merges(all_merges: List[MergedCellRange], at_row_idx: int, amount: int=1) -> List[MergedCellRange]:
+def merge_cells(ws: Worksheet, all_merges: List[MergedCellRange]) -> None:
     """
-    Shifts the row indices of the given merged cell ranges list located below the at_row_idx row.
-    Returns a list of MergedCellRange.
+    Add the given merge ranges.
     """
-    # 3. Re-add merged cells with adjusted coordinates
-    new_merges = []
     for range_obj in all_merges:
         range_str = str(range_obj)
-        min_col, min_row, max_col, max_row = range_boundaries(range_str)
-        # Check if the merged range is located entirely or partially below the deleted row
-        if min_row > at_row_idx:
-            # Shift the range up by 'amount'
-            new_min_row = min_row - amount
-            new_max_row = max_row - amount
-            min_col_letter = get_column_letter(min_col)
-            max_col_letter = get_column_letter(max_col)
-            new_range_str = f"{min_col_letter}{new_min_row}:{max_col_letter}{new_max_row}"
-            new_merges.append(CellRange(new_range_str))
-        # Note: If the at_row_idx cuts through a merged area, openpyxl's 
-        # original unmerge/re-merge behavior handles it, but complex cases 
-        # (like deleting a row in the middle of a merge) require more logic.
-        # This function handles the common case where you delete a row *above* the merge.
+        ws.merge_cells(range_str)
+    return None
+#--------------------------------------------------------------------------------------------------
+def compact_rows(ws: Worksheet, rows_to_delete: set) -> dict:
+    """
+    Deletes all the given rows in one pass over the cells, row dimensions and merged ranges,
+    shifting the rows below them up. Merged ranges must not overlap the deleted rows.
+    Returns the new row number of each kept row, by old row number.
+    """
+    # Map the kept rows to their new row numbers.
+    row_map = {}
+    deleted = 0
+    for row in range(1,ws.max_row+1):
+        if row in rows_to_delete:
+            deleted += 1
         else:
-            # Re-add the range as is if it's above or fully within the deleted area
-            new_merges.append(range_obj)
-    return new_merges
+            row_map[row] = row - deleted
+    if not deleted:
+        return row_map
+    # Unmerge once, the ranges are re-added shifted after the cells are moved.
+    all_merges = unmerge_cells(ws) or []
+    # Move the cells of the kept rows, drop the cells of the deleted rows.
+    cells = {}
+    for (row,col),cell in ws._cells.items():
+        if (new_row := row_map.get(row)) is not None:
+            cell.row = new_row
+            cells[(new_row,col)] = cell
+    ws._cells = cells
+    # Move the row height and visibility properties.
+    row_dimensions = {row_map[row]: dim for row,dim in ws.row_dimensions.items() if row in row_map}
+    ws.row_dimensions.clear()
+    for new_row,dim in row_dimensions.items():
+        ws.row_dimensions[new_row] = dim
+    # Re-add the merged ranges.
+    merge_cells(ws,[
+        CellRange(
+            min_col=range_obj.min_col
+            ,min_row=row_map[range_obj.min_row]
+            ,max_col=range_obj.max_col
+            ,max_row=row_map[range_obj.max_row]
+        )
+        for range_obj in all_merges
+    ])
+    return row_map
 #--------------------------------------------------------------------------------------------------
-def merge_cells(ws: Worksheet, all_merges: List[MergedCellRange]) -> None:
+def cleanup_single_cell_merges(ws: Worksheet ) -> Worksheet:
     """
-    Add the given merge ranges.
+    Removes single-cell ranges (e.g., 'A6') from the worksheet's merged_cells set.
     """
-    for range_obj in all_merges:
-        range_str = str(range_obj)
-        ws.merge_cells(range_str)
+    # The ranges carry their boundaries, so no range string needs to be parsed.
+    single_cell_merges = [
+        range_obj for range_obj in ws.merged_cells.ranges
+        if range_obj.min_row == range_obj.max_row and range_obj.min_col == range_obj.max_col
+    ]
+    for range_obj in single_cell_merges:
+        # It's a single cell (e.g., A6:A6), so we remove it
+        ws.unmerge_cells(range_obj.coord)
+    return ws
+#--------------------------------------------------------------------------------------------------
+def copy_sheet_contents(source_ws: Worksheet, target_ws: Worksheet, styles: StyleRegistry, first_row: int=6) -> None:
+    """
+    Replaces the rows of target_ws from first_row on (cells, merged cells and row heights) with
+    those of source_ws, a sheet of another workbook (e.g. a month sheet of the previous output
+    workbook). The header rows above first_row are kept from target_ws: load_workbook() does not
+    keep the styles of the cells covered by merged cells.
+    """
+    for key in [key for key in target_ws._cells if key[0] >= first_row]:
+        del target_ws._cells[key]
+    target_ws.merged_cells.ranges = {merged_range for merged_range in target_ws.merged_cells.ranges if merged_range.max_row < first_row}
+    for row_num in [row_num for row_num in target_ws.row_dimensions if row_num >= first_row]:
+        del target_ws.row_dimensions[row_num]
+    for merged_range in source_ws.merged_cells.ranges:
+        if merged_range.min_row >= first_row:
+            target_ws.merge_cells(merged_range.coord)
+    for (row_num,column_idx),source_cell in source_ws._cells.items():
+        if row_num < first_row:
+            continue
+        target_cell = target_ws.cell(row_num,column_idx)
+        if not isinstance(source_cell,MergedCell):
+            target_cell.value = source_cell.value
+        target_cell._style = copy.copy(styles.imported_style(source_cell))
+    for row_num,row_dimension in source_ws.row_dimensions.items():
+        if row_num >= first_row and row_dimension.height is not None:
+            target_ws.row_dimensions[row_num].height = row_dimension.height
     return None
 #--------------------------------------------------------------------------------------------------
-def shift_row_dimensions(ws: Worksheet, deleted_row_idx: int, amount: int=1) -> None:
-    """Shifts row height and visibility properties."""
-    # Collect all row numbers greater than the deleted row index
-    rows_to_shift = sorted([r for r in ws.row_dimensions.keys() if r > deleted_row_idx])
-    # Shift from the lowest index upward to avoid overwriting keys
-    for old_row in rows_to_shift:
-        new_row = old_row - amount
-        # Copy the dimension object
-        ws.row_dimensions[new_row] = ws.row_dimensions[old_row]
-        # Clean up the old entry
-        del ws.row_dimensions[old_row]
-    # If a dimension existed for the row being deleted, ensure it's removed
-    if deleted_row_idx in ws.row_dimensions:
-        del ws.row_dimensions[deleted_row_idx]
+def restore_dimension_holders(wb: Workbook) -> None:
+    """
+    Restores the worksheet and default factory of the row and column dimension holders of an
+    unpickled workbook. Unpickling drops them, so missing rows or columns would raise KeyError.
+    """
+    for ws in wb.worksheets:
+        ws.row_dimensions.worksheet = ws
+        ws.row_dimensions.default_factory = ws._add_row
+        ws.column_dimensions.worksheet = ws
+        ws.column_dimensions.default_factory = ws._add_column
     return None
 #--------------------------------------------------------------------------------------------------
-def delete_rows(ws: Worksheet, deleted_row_idx: int, amount: int=1) -> None:
+def save_debug_snapshot(wb: Workbook, xlsx_filename: str, debug_snapshots: bool) -> None:
     """
-    Delete rows, ensuring that that the row-level formatting is correctly moved for shifted rows 
-    due to the delete.
+    Saves the in-progress workbook to xlsx_filename when debug_snapshots is set.
+    The pipeline stages share the live workbook, so this is only for inspecting a stage's result.
     """
-    shift_row_dimensions(ws,deleted_row_idx,amount)
-    all_merges = unmerge_cells(ws)
-    new_all_merges = shift_merges(all_merges,deleted_row_idx,amount)
-    ws.delete_rows(deleted_row_idx,amount) # This must be called *after* shifting merges!
-    merge_cells(ws,new_all_merges)
+    if debug_snapshots:
+        logger.debug(f"Saving debug snapshot: {xlsx_filename}")
+        wb.save(xlsx_filename)
     return None
 #--------------------------------------------------------------------------------------------------
-def cleanup_single_cell_merges(ws: Worksheet ) -> Worksheet:
+def get_config_fingerprint(yaml_config: dict, calendar_year: int, legacy_layout: bool=False) -> str:
     """
-    Removes single-cell ranges (e.g., 'A6') from the worksheet's merged_cells set.
+    Returns the fingerprint of the resolved YAML configuration, the calendar year, the layout
+    path and this script's code.
     """
-    all_merges = list(ws.merged_cells)
-    for range_obj in all_merges:
-        range_str = str(range_obj)
-        # Get the boundary coordinates (min_col, min_row, max_col, max_row)
-        min_col, min_row, max_col, max_row = range_boundaries(range_str)
-        # 2. Check if the range spans more than one cell
-        if max_row == min_row and max_col == min_col:
-            # It's a single cell (e.g., A6:A6), so we remove it
-             ws.unmerge_cells(range_str)
-    return ws
+    fingerprint = hashlib.sha256()
+    fingerprint.update(json.dumps(yaml_config,sort_keys=True,default=str).encode('utf-8'))
+    fingerprint.update(f"{calendar_year}|{legacy_layout}".encode('utf-8'))
+    fingerprint.update(Path(__file__).read_bytes())
+    return fingerprint.hexdigest()
 #--------------------------------------------------------------------------------------------------
-def get_odyssey_court_sessions_by_year(year: int,config: configparser) -> DataFrame:
+def get_skeleton_fingerprint(yaml_config: dict, calendar_year: int) -> str:
+    """
+    Returns the fingerprint of what the month sheets skeleton (see build_sheet_skeleton()) is
+    built from: the YAML worksheet and constants sections, the superior judges of the subtitles,
+    the calendar year, this script's code and the openpyxl version the skeleton is pickled with.
+    """
+    fingerprint = hashlib.sha256()
+    skeleton_config = {
+        'worksheet': yaml_config['worksheet']
+        ,'constants': yaml_config['constants']
+        ,'superior_judges': yaml_config['data']['superior_judges']
+    }
+    fingerprint.update(json.dumps(skeleton_config,sort_keys=True,default=str).encode('utf-8'))
+    fingerprint.update(f"{calendar_year}|{openpyxl_version}".encode('utf-8'))
+    fingerprint.update(Path(__file__).read_bytes())
+    return fingerprint.hexdigest()
+#--------------------------------------------------------------------------------------------------
+def get_run_fingerprint(court_sessions_df: DataFrame, yaml_config: dict, calendar_year: int, legacy_layout: bool=False, save_settings: str='') -> str:
+    """
+    Returns the fingerprint of the inputs of a run: the fetched court session rows, the
+    configuration fingerprint and the save_settings of the packager (XlsxPackager.output_settings).
+    Runs with the same fingerprint save the same workbook file.
+    court_sessions_df may be a CachedCourtSessions, hashed chunk by chunk.
+    """
+    fingerprint = hashlib.sha256(get_config_fingerprint(yaml_config,calendar_year,legacy_layout).encode('utf-8'))
+    fingerprint.update(save_settings.encode('utf-8'))
+    fingerprint.update(','.join(court_sessions_df.columns).encode('utf-8'))
+    chunks = court_sessions_df.iter_chunks() if isinstance(court_sessions_df,CachedCourtSessions) else [court_sessions_df]
+    for chunk in chunks:
+        # As text, so the rows hash the same whether fetched or read from the cache (datetime64[ns] or [us]).
+        fingerprint.update(pd.util.hash_pandas_object(chunk.astype(str),index=False).values.tobytes())
+    return fingerprint.hexdigest()
+#--------------------------------------------------------------------------------------------------
+def get_month_digests(court_sessions: CourtSessionIndex, yaml_config: dict, calendar_year: int, legacy_layout: bool=False) -> dict:
+    """
+    Returns the digest of the inputs of each month sheet: the court sessions and special dates
+    of the month's days, as aligned by convert_df_to_list(), and the configuration fingerprint.
+    A month sheet is the same as long as its digest is.
+    """
+    config_fingerprint = get_config_fingerprint(yaml_config,calendar_year,legacy_layout)
+    calendar_dimension = get_calendar_dimension(calendar_year)
+    month_digests = {}
+    for month in range(1,13):
+        digest = hashlib.sha256(config_fingerprint.encode('utf-8'))
+        month_start = calendar_dimension.month_start[month]
+        for dt in calendar_dimension.dates[month_start:month_start+calendar_dimension.month_num_days[month]]:
+            digest.update(repr((dt,court_sessions.day_sessions(dt))).encode('utf-8'))
+        month_digests[month] = digest.hexdigest()
+    return month_digests
+#--------------------------------------------------------------------------------------------------
+def set_month_digests(wb: Workbook, month_digests: dict) -> None:
+    """Stores the month digests in the new workbook, as the MONTH_DIGESTS_PROPERTY custom document property."""
+    wb.custom_doc_props.append(StringProperty(name=MONTH_DIGESTS_PROPERTY,value=json.dumps(month_digests)))
+    return None
+#--------------------------------------------------------------------------------------------------
+def load_previous_workbook(workbook_name: str, sheet_titles: list) -> tuple:
+    """
+    Returns the previous output workbook and the month digests stored in it.
+    Returns (None,{}) if there is none, it has no digests or its sheets are not sheet_titles.
+    """
+    if not Path(workbook_name).is_file():
+        return None,{}
+    try:
+        previous_wb = load_workbook(workbook_name)
+    except Exception as e:
+        logger.warning(f"Unable to load the previous workbook {workbook_name}, rendering all months: {e}")
+        return None,{}
+    if MONTH_DIGESTS_PROPERTY not in previous_wb.custom_doc_props.names or previous_wb.sheetnames != sheet_titles:
+        return None,{}
+    month_digests = json.loads(previous_wb.custom_doc_props[MONTH_DIGESTS_PROPERTY].value)
+    return previous_wb,{int(month): digest for month,digest in month_digests.items()}
+#--------------------------------------------------------------------------------------------------
+#--------------------------------------------------------------------------------------------------
+def create_odyssey_engine(config: configparser, pool_size: int=None):
+    """
+    Creates the SQLAlchemy Engine of the Odyssey database of the [SQL] section.
+    pool_size: Bound the engine's connection pool to pool_size connections (no overflow).
+    """
     # Construct the ODBC connection string with Trusted_Connection=yes
     odbc_conn_str = (
         f"DRIVER={{{config['SQL']['driver_name']}}};"  # Note the double curly braces for the driver name
@@ -354,20 +1843,64 @@ def get_odyssey_court_sessions_by_year(year: int,config: configparser) -> DataFr
     # The format is: dialect+driver:///?odbc_connect=params
     DB_URI = f"mssql+pyodbc:///?odbc_connect={params}"
     # Create the SQLAlchemy Engine
-    engine = create_engine(DB_URI)
+    if pool_size:
+        engine = create_engine(DB_URI,pool_size=pool_size,max_overflow=0)
+    else:
+        engine = create_engine(DB_URI)
     logger.info("SQLAlchemy Engine created successfully using Windows Authentication.")
-    # Define SQL stament to execute the stored procedure.
+    return engine
+#--------------------------------------------------------------------------------------------------
+def get_court_sessions_sql(year: int, config: configparser) -> tuple:
+    """Returns the SQL and parameters of the year's [SQL] court_sessions_query (procedure or lean)."""
+    if config.get('SQL','court_sessions_query',fallback='procedure') == 'lean':
+        sql_query = read_sql_file(config,'lean_query_file','.sql/qry_courtsessions_by_date_range.sql')
+        return sql_query, (date(year,1,1),date(year,12,31))
     sql_query = f"""
         SET NOCOUNT ON;
         exec Justice.fc.sp_getCourtSessionsByYear @pMonthOrYear=?;
     """
+    return sql_query, (year,)
+#--------------------------------------------------------------------------------------------------
+def iter_odyssey_court_session_batches(year: int, config: configparser, batch_size: int):
+    """
+    Yields the year's court sessions of the [SQL] court_sessions_query in DataFrames of at most
+    batch_size rows, as they are fetched, so the whole result set is never held in memory.
+    """
+    engine = create_odyssey_engine(config)
+    sql_query, params = get_court_sessions_sql(year,config)
+    try:
+        for batch in pd.read_sql(
+            sql=sql_query,
+            con=engine,      # Pass the SQLAlchemy Engine
+            params=params,
+            chunksize=batch_size
+        ):
+            batch['SessionDate'] = pd.to_datetime(batch['SessionDate'])
+            yield batch.reindex(columns=COURT_SESSION_COLUMNS)
+    except Exception as e:
+        logger.exception(f"\nAn error occurred: {e}")
+        raise
+    finally:
+        engine.dispose()
+#--------------------------------------------------------------------------------------------------
+def get_odyssey_court_sessions_by_year(year: int,config: configparser) -> DataFrame:
+    """
+    Returns the year's court sessions from the query selected by [SQL] court_sessions_query:
+      procedure: Justice.fc.sp_getCourtSessionsByYear (default).
+      lean: .sql/qry_courtsessions_by_date_range.sql
+    """
+    if config.get('SQL','court_sessions_query',fallback='procedure') == 'lean':
+        return get_odyssey_court_sessions_by_date_range(date(year,1,1),date(year,12,31),config)
+    engine = create_odyssey_engine(config)
+    # Define SQL stament to execute the stored procedure.
+    sql_query, params = get_court_sessions_sql(year,config)
     # Execute the SQL stored procedure to get all of the Odyssey court sessions for the
     # given year and store the results in a Pandas DataFrame.
     try:
         df = pd.read_sql(
             sql=sql_query,
             con=engine,      # Pass the SQLAlchemy Engine
-            params=(year,) 
+            params=params
         )
         df['SessionDate'] = pd.to_datetime(df['SessionDate'])
     except Exception as e:
@@ -376,36 +1909,270 @@ def get_odyssey_court_sessions_by_year(year: int,config: configparser) -> DataFr
         engine.dispose()
     return df
 #--------------------------------------------------------------------------------------------------
-def convert_df_to_list(df: DataFrame,yaml_config) -> list:
+def get_odyssey_court_sessions_by_date_range(begin_date: date, end_date: date, config: configparser, engine=None) -> DataFrame:
+    """
+    Returns the court sessions of begin_date..end_date from the lean query ([SQL] lean_query_file),
+    with the stored procedure's columns. The columns the lean query leaves out are empty.
+    engine: A shared (pooled) engine to use. If None, an engine is created and disposed of.
+    """
+    shared_engine = engine is not None
+    if not shared_engine:
+        engine = create_odyssey_engine(config)
+    sql_query = read_sql_file(config,'lean_query_file','.sql/qry_courtsessions_by_date_range.sql')
+    try:
+        df = pd.read_sql(
+            sql=sql_query,
+            con=engine,      # Pass the SQLAlchemy Engine
+            params=(begin_date,end_date)
+        )
+        df['SessionDate'] = pd.to_datetime(df['SessionDate'])
+        df = df.reindex(columns=COURT_SESSION_COLUMNS)
+    except Exception as e:
+        logger.exception(f"\nAn error occurred: {e}")
+        raise
+    finally:
+        if not shared_engine:
+            engine.dispose()
+    return df
+#--------------------------------------------------------------------------------------------------
+def get_odyssey_court_sessions_by_month(year: int, config: configparser, months: list=range(1,13), on_month=None) -> dict:
+    """
+    Fetches the court sessions of each month of the year with the lean query, concurrently,
+    over a pool of [SQL] pool_size connections.
+    on_month(month, df) is called with each month's sessions as they arrive.
+    Returns the sessions by month.
+    """
+    pool_size = config.getint('SQL','pool_size',fallback=4)
+    engine = create_odyssey_engine(config,pool_size=pool_size)
+    month_dfs = {}
+    try:
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            futures = {
+                executor.submit(
+                    get_odyssey_court_sessions_by_date_range
+                    ,date(year,month,1)
+                    ,date(year,month,get_calendar_dimension(year).month_num_days[month])
+                    ,config
+                    ,engine
+                ): month
+                for month in months
+            }
+            for future in as_completed(futures):
+                month = futures[future]
+                month_dfs[month] = future.result()
+                logger.info(f"Fetched {len(month_dfs[month])} court sessions of {calendar.month_name[month]} {year}.")
+                if on_month is not None:
+                    on_month(month,month_dfs[month])
+    finally:
+        engine.dispose()
+    return month_dfs
+#--------------------------------------------------------------------------------------------------
+def read_sql_file(config: configparser, option: str, fallback: str) -> str:
+    """Returns the SQL of the .sql file named by the [SQL] option, relative to this script."""
+    sql_file = Path(config.get('SQL',option,fallback=fallback))
+    if not sql_file.is_absolute():
+        sql_file = Path(__file__).parent / sql_file
+    return sql_file.read_text(encoding='utf-8')
+#--------------------------------------------------------------------------------------------------
+def get_odyssey_court_session_changes(year: int, since: datetime, config: configparser) -> DataFrame:
+    """
+    Returns the court sessions created, changed or deleted in Odyssey since the high-water mark,
+    or all court sessions of the year if since is None, with their CourtSessionID, Deleted,
+    Included (in the court house) and ChangedAt columns.
+    """
+    engine = create_odyssey_engine(config)
+    sql_query = read_sql_file(config,'changes_query_file','.sql/qry_courtsession_changes.sql')
+    try:
+        df = pd.read_sql(
+            sql=sql_query,
+            con=engine,      # Pass the SQLAlchemy Engine
+            params=(date(year,1,1),date(year,12,31),since)
+        )
+        df['SessionDate'] = pd.to_datetime(df['SessionDate'])
+    except Exception as e:
+        logger.exception(f"\nAn error occurred: {e}")
+        raise
+    finally:
+        engine.dispose()
+    return df
+#--------------------------------------------------------------------------------------------------
+def load_offline_court_sessions(year: int, config: configparser) -> DataFrame:
+    """
+    Loads the court sessions of the year without Odyssey, from the first of:
+      - the courtsession table of the [Cache] offline_db DuckDB database,
+      - the headerless CSV exports named <year>*.csv (e.g. 202509.csv) in [Cache] offline_csv_folder.
+    """
+    offline_db = Path(config.get('Cache','offline_db',fallback='sp_getcourtsessionsbyyear.db'))
+    if offline_db.is_file():
+        with duckdb.connect(database=str(offline_db),read_only=True) as ddb_conn:
+            has_table = ddb_conn.execute(
+                "select count(*) from information_schema.tables where table_name = 'courtsession'"
+            ).fetchone()[0]
+            if has_table:
+                df = ddb_conn.execute(f"""
+                    select {', '.join(COURT_SESSION_COLUMNS)}
+                    from courtsession
+                    where year(SessionDate) = ?
+                    order by SessionDate, StartTime, SessionDescription collate nocase, CalendarDescription collate nocase
+                """,(year,)).df()
+                if len(df):
+                    logger.info(f"Loaded {len(df)} court sessions from {offline_db}.")
+                    return df
+    csv_folder = Path(config.get('Cache','offline_csv_folder',fallback='./data'))
+    csv_files = sorted(csv_folder.glob(f"{year}*.csv"))
+    if csv_files:
+        # The CSV exports have the stored procedure's columns, without the court room.
+        df = pd.concat(
+            [
+                pd.read_csv(
+                    csv_file
+                    ,header=None
+                    ,names=COURT_SESSION_COLUMNS[:6]
+                    ,dtype=str
+                    ,encoding='utf-8-sig'
+                    ,keep_default_na=False
+                )
+                for csv_file in csv_files
+            ]
+            ,ignore_index=True
+        )
+        df['SessionDate'] = pd.to_datetime(df['SessionDate'])
+        df['CourtRoomCode'] = ''
+        df['CourtRoomDescription'] = ''
+        logger.info(f"Loaded {len(df)} court sessions from {', '.join(str(f) for f in csv_files)}.")
+        return df
+    raise Exception(f"No offline court sessions found for {year}. Looked in the cache, {offline_db} and {csv_folder}.")
+#--------------------------------------------------------------------------------------------------
+def get_court_sessions(year: int, config: configparser, offline: bool=False, refresh_cache: bool=False, delta_sync: bool=False) -> DataFrame:
+    """
+    Returns the court sessions of the year from the local cache if it has an unexpired entry,
+    else fetches them from Odyssey and caches them.
+    offline: Never query Odyssey, use the cache regardless of its age or the offline sources.
+    refresh_cache: Drop the cached entry first (with delta_sync, the year's session store).
+    delta_sync: Fetch only the sessions changed since the year's high-water mark into the
+        session store (all of the year's sessions on the first sync) and return the store's sessions.
+    With [SQL] fetch_batch_size, the court sessions are left in the cache: a CachedCourtSessions
+    is returned instead of a DataFrame.
+    """
+    cache = CourtSessionCache.from_config(config)
+    if delta_sync:
+        if refresh_cache:
+            logger.info(f"Resetting the session store of {year}.")
+            cache.reset_sync(year)
+        since = cache.high_water_mark(year)
+        if not offline:
+            # Fetch again the changes of the [SQL] delta_sync_overlap_minutes before the high-water
+            # mark: a transaction committed after the last sync can carry an earlier timestamp.
+            # The upsert replaces the rows fetched twice.
+            overlap = timedelta(minutes=config.getfloat('SQL','delta_sync_overlap_minutes',fallback=15))
+            fetch_since = since - overlap if since is not None else None
+            logger.info(f"Fetching court sessions changed since {fetch_since or 'the start of ' + str(year)}.")
+            cache.upsert_changes(year,get_odyssey_court_session_changes(year,fetch_since,config))
+        if since is not None or not offline:
+            return cache.store_sessions(year)
+    # The month fetch always uses the lean query, the stored procedure only takes months of the current year.
+    parallel_month_fetch = config.getboolean('SQL','parallel_month_fetch',fallback=False)
+    query = 'lean' if parallel_month_fetch else config.get('SQL','court_sessions_query',fallback='procedure')
+    cache_key = cache.key(year,query)
+    # Months are cached by yyyymm.
+    month_keys = {month: cache.key(year*100+month,query) for month in range(1,13)}
+    if refresh_cache:
+        logger.info(f"Invalidating cache entry {cache_key}.")
+        cache.invalidate(cache_key)
+        if parallel_month_fetch:
+            for month_key in month_keys.values():
+                cache.invalidate(month_key)
+    batch_size = config.getint('SQL','fetch_batch_size',fallback=0)
+    cached_sessions = cache.entry(cache_key,ignore_ttl=offline)
+    if cached_sessions is not None:
+        return cached_sessions if batch_size > 0 and not parallel_month_fetch else cached_sessions.to_df()
+    if offline:
+        return load_offline_court_sessions(year,config)
+    if parallel_month_fetch:
+        # Reuse the unexpired cached months, fetch the others concurrently and cache each
+        # month as it arrives.
+        month_dfs = {}
+        for month,month_key in month_keys.items():
+            month_df = cache.get(month_key)
+            if month_df is not None:
+                month_dfs[month] = month_df
+        month_dfs.update(get_odyssey_court_sessions_by_month(
+            year
+            ,config
+            ,months=[month for month in range(1,13) if month not in month_dfs]
+            ,on_month=lambda month,month_df: cache.put(month_keys[month],month_df,config['SQL']['server_name'])
+        ))
+        df = pd.concat([month_dfs[month] for month in range(1,13)],ignore_index=True)
+    elif batch_size > 0:
+        # Stream the batches straight into the cache, where they are left.
+        num_rows = cache.put_batches(
+            cache_key
+            ,iter_odyssey_court_session_batches(year,config,batch_size)
+            ,config['SQL']['server_name']
+        )
+        logger.info(f"Fetched {num_rows} court sessions in batches of {batch_size}.")
+        return CachedCourtSessions(cache,cache_key)
+    else:
+        df = get_odyssey_court_sessions_by_year(year,config)
+    cache.put(cache_key,df,config['SQL']['server_name'])
+    return df
+#--------------------------------------------------------------------------------------------------
+@functools.lru_cache(maxsize=8)
+def compile_session_mappings(odyssey_names: tuple) -> SessionMappingMatcher:
+    """
+    Returns the SessionMappingMatcher of the sessions_mapping odyssey_names.
+    Cached, so the mappings are compiled once per configuration.
+    """
+    return SessionMappingMatcher(odyssey_names)
+#--------------------------------------------------------------------------------------------------
+def classify_session_descriptions(descriptions, sessions_mapping: list, cache: CourtSessionCache=None) -> DataFrame:
+    """
+    Returns the SessionDescription and MappingKey (index of the best sessions_mapping, null if
+    none matches) of each distinct description. The descriptions already classified by an
+    earlier run with the same mappings are taken from the cache, the others are added to it.
+    """
+    matcher = compile_session_mappings(tuple(record['odyssey_name'] for record in sessions_mapping))
+    mapping_keys = cache.mapping_keys(matcher.fingerprint) if cache else {}
+    new_mapping_keys = {
+        description: matcher.classify(description)
+        for description in descriptions
+        if description not in mapping_keys
+    }
+    if cache and new_mapping_keys:
+        cache.put_mapping_keys(matcher.fingerprint,new_mapping_keys)
+    mapping_keys.update(new_mapping_keys)
+    logger.debug(f"Classified {len(new_mapping_keys)} new of {len(descriptions)} session descriptions.")
+    return DataFrame(
+        [(description,mapping_keys[description]) for description in descriptions]
+        ,columns=['SessionDescription','MappingKey']
+    )
+#--------------------------------------------------------------------------------------------------
+def convert_df_to_list(df: DataFrame,yaml_config,db_path: str=':memory:',cache: CourtSessionCache=None) -> CourtSessionIndex:
     court_session_list = []
-    sessions = []
+    court_sessions = CourtSessionIndex()
+    # In memory DuckDB DB unless a calendar_db is configured (to inspect the tables after the run).
+    persist = db_path != ':memory:'
     try:
-        # Create a connection to an in memory DuckDB DB.
-        #ddb_conn = duckdb.connect(database=':memory:')
-        ddb_conn = duckdb.connect(database=r'.zsandbox\court_calendar.db')
+        ddb_conn = duckdb.connect(database=db_path)
         #
         # Get the judges from the YAML configuration
         judges = []
         judges = yaml_config['data']['superior_judges'] + yaml_config['data']['state_judges']
-        # Create table and insert the judges
-        DUCKDB_TABLE_NAME = "judge"
-        ddb_conn.sql(f"""
-drop table if exists {DUCKDB_TABLE_NAME};
-CREATE TABLE {DUCKDB_TABLE_NAME} (
-    Name VARCHAR
-    ,OysseyCode VARCHAR
-    ,Color VARCHAR
- );
+        # Create the judge table from the judges in one call.
+        judge_df = DataFrame(
+            [(record['name'],record['odyssey_code'],record['color']) for record in judges]
+            ,columns=['Name','OysseyCode','Color']
+        )
+        ddb_conn.sql("""
+create or replace table judge as
+select
+  Name::varchar as Name
+  ,OysseyCode::varchar as OysseyCode
+  ,Color::varchar as Color
+from
+  judge_df
+;
         """)
-        # Insert the judges
-        # DuckDB handles the list insertion automatically when passed as a parameter.
-        for record in judges:
-            ordered_values = (
-                record['name']
-                ,record['odyssey_code']
-                ,record['color']
-            )
-            ddb_conn.execute(f"INSERT INTO {DUCKDB_TABLE_NAME} VALUES (?, ?, ?)", ordered_values)
         #
         #
         # Get the Special Dates from the YAML configuration
@@ -422,55 +2189,102 @@ CREATE TABLE {DUCKDB_TABLE_NAME} (
                         ,'display_order': sp_dt['display_order']
                     }
                     special_dates.append(new_sp_dt)
-        # Create table and insert the special dates.
-        DUCKDB_TABLE_NAME = "special_date"
-        ddb_conn.sql(f"""
-drop table if exists {DUCKDB_TABLE_NAME};
-CREATE TABLE {DUCKDB_TABLE_NAME} (
-    Name VARCHAR
-    ,Date DATE
-    ,Color VARCHAR
-    ,DisplayOrder int
- );
+        # Create the special_date table from the special dates in one call.
+        special_date_df = DataFrame(
+            [(record['name'],record['date'],record['color'],record['display_order']) for record in special_dates]
+            ,columns=['Name','Date','Color','DisplayOrder']
+        )
+        ddb_conn.sql("""
+create or replace table special_date as
+select
+  Name::varchar as Name
+  ,Date::date as Date
+  ,Color::varchar as Color
+  ,DisplayOrder::int as DisplayOrder
+from
+  special_date_df
+;
         """)
-        # Insert the special_dates.
-        # DuckDB handles the list insertion automatically when passed as a parameter.
-        for record in special_dates:
-            ordered_values = (
-                record['name'] 
-                ,record['date'] 
-                ,record['color']
-                ,record['display_order']
-            )
-            ddb_conn.execute(f"INSERT INTO {DUCKDB_TABLE_NAME} VALUES (?, ?, ?, ?)", ordered_values)
         #
         # Get the Court Session mappings from the YAML configuration.
         courtsession_mapping_list = yaml_config['data']['sessions_mapping']
-        # Create the table schema first
-        DUCKDB_TABLE_NAME = "courtsession_mapping"
-        ddb_conn.sql(f"""
-drop table if exists {DUCKDB_TABLE_NAME};
-CREATE TABLE {DUCKDB_TABLE_NAME} (
-    OdysseyCourtSession VARCHAR
-    ,CalendarFormat VARCHAR
-    ,DisplayOrder int
-);
+        # Create the courtsession_mapping table from the mappings in one call.
+        # MappingKey is the index of the mapping, as classified by SessionMappingMatcher.
+        courtsession_mapping_df = DataFrame(
+            [
+                (mapping_key,record['odyssey_name'],record['calendar_name'],record['display_order'])
+                for mapping_key,record in enumerate(courtsession_mapping_list)
+            ]
+            ,columns=['MappingKey','OdysseyCourtSession','CalendarFormat','DisplayOrder']
+        )
+        ddb_conn.sql("""
+create or replace table courtsession_mapping as
+select
+  MappingKey::int as MappingKey
+  ,OdysseyCourtSession::varchar as OdysseyCourtSession
+  ,CalendarFormat::varchar as CalendarFormat
+  ,DisplayOrder::int as DisplayOrder
+from
+  courtsession_mapping_df
+;
         """)
-        # Insert the entire list of records using the built-in VALUES clause
-        # DuckDB handles the list insertion automatically when passed as a parameter.
-        for record in courtsession_mapping_list:
-            ordered_values = (
-                record['odyssey_name'] 
-                ,record['calendar_name'] 
-                ,record['display_order']
-            )
-            ddb_conn.execute(f"INSERT INTO {DUCKDB_TABLE_NAME} VALUES (?, ?, ?)", ordered_values)
-        #
-        # Create Court Sessions DB table from DataFramedf.
+        # Court Sessions DB view of the DataFrame: DuckDB scans df in place, it is not copied.
+        # Copied to a table only when the DB is persisted, or read chunk by chunk from the court
+        # sessions cache (CachedCourtSessions).
         DUCKDB_TABLE_NAME = 'courtsession'
-        ddb_conn.sql(f"""
-            drop table if exists {DUCKDB_TABLE_NAME};
-            CREATE TABLE {DUCKDB_TABLE_NAME} AS SELECT * FROM df;
+        if isinstance(df,CachedCourtSessions):
+            df.copy_to(ddb_conn,DUCKDB_TABLE_NAME)
+        elif persist:
+            ddb_conn.register('courtsession_df',df)
+            ddb_conn.sql(f"create or replace table {DUCKDB_TABLE_NAME} as select * from courtsession_df;")
+        else:
+            ddb_conn.register(DUCKDB_TABLE_NAME,df)
+        #
+        # Create the courtsession_class table of the best mapping of each distinct session description,
+        # so the sessions are joined to their mapping on MappingKey.
+        courtsession_class_df = classify_session_descriptions(
+            [
+                description for (description,) in ddb_conn.execute(
+                    f"select distinct SessionDescription from {DUCKDB_TABLE_NAME} where SessionDescription is not null"
+                ).fetchall()
+            ]
+            ,courtsession_mapping_list
+            ,cache
+        )
+        ddb_conn.sql("""
+create or replace table courtsession_class as
+select
+  SessionDescription::varchar as SessionDescription
+  ,MappingKey::int as MappingKey
+from
+  courtsession_class_df
+;
+        """)
+        #
+        # Create the calendar_day table of the years of the court sessions and special dates.
+        calendar_day_df = get_calendar_day_df(
+            {
+                year for (year,) in ddb_conn.execute(
+                    f"select distinct year(SessionDate::date) from {DUCKDB_TABLE_NAME} where SessionDate is not null"
+                ).fetchall()
+            }
+            | {record['date'].year for record in special_dates}
+        )
+        ddb_conn.sql("""
+create or replace table calendar_day as
+select
+  Date::date as Date
+  ,Year::int as Year
+  ,Month::int as Month
+  ,Day::int as Day
+  ,Weekday::int as Weekday
+  ,Week::int as Week
+  ,WeekOfMonth::int as WeekOfMonth
+  ,Workday::boolean as Workday
+  ,ColumnIdx::int as ColumnIdx
+from
+  calendar_day_df
+;
         """)
         # Create a list of the court sessions transitioned via the mapping and special_dates
         # and resulting in a the form needed to be displayed in the calendar.
@@ -530,70 +2344,39 @@ select
   ,j.Color as Color
   ,cs.JudicialOfficerCode as JudicialOfficerCode
   ,if(cs_m.DisplayOrder is null,3,cs_m.DisplayOrder) as DisplayOrder
-  ,strftime(SessionDate,'%U')::int as Week
+  ,cd.Week as Week
 from
   courtsession cs 
+  left outer join calendar_day cd
+  on
+    cd.Date = cs.SessionDate::date
   left outer join judge j
   on
    j.OysseyCode = cs.JudicialOfficerCode
-  left outer join courtsession_mapping cs_m 
+  left outer join courtsession_class cs_c
   on
-    cs.SessionDescription ilike concat(
-      '%'
-      ,replace(
-        replace(
-          cs_m.OdysseyCourtSession
-          ,'-'
-          ,''
-        )
-        ,' '
-        ,'%'
-      )
-      ,'%'
-    )
+    cs_c.SessionDescription = cs.SessionDescription
+  left outer join courtsession_mapping cs_m
+  on
+    cs_m.MappingKey = cs_c.MappingKey
 union
 select
-  strftime(Date,'%Y-%m-%d') as SessionDate
+  strftime(sd.Date,'%Y-%m-%d') as SessionDate
   ,'' as StartTime
-  ,Name as SessionDescription
-  ,Color as Color
+  ,sd.Name as SessionDescription
+  ,sd.Color as Color
   ,'' as JudicialOfficerCode
-  ,DisplayOrder as DisplayOrder
-  ,strftime(Date,'%U')::int as Week
-from
-  special_date
-;
--- ================================================================================================
--- Get list of unique sessions in each week, sorting
--- and adding a row_num so to have ability to maintain 
--- same sort order.
-select
-  SessionDescription
-  ,Week
-  ,row_number() over (order by Week,DisplayOrder,SessionDescription) row_num
+  ,sd.DisplayOrder as DisplayOrder
+  ,cd.Week as Week
 from
-  (
-    select distinct
-      SessionDescription
-      ,DisplayOrder
-      ,Week
-    from
-      tmp_courtsession
-    where
-      StartTime = ''
-    order by
-      Week
-      ,DisplayOrder
-      ,SessionDescription
-  ) z
-  order by
-    Week
-    ,DisplayOrder
-    ,SessionDescription
+  special_date sd
+  left outer join calendar_day cd
+  on
+    cd.Date = sd.Date
 ;
 -- ================================================================================================
 """
-        week_sessions = ddb_conn.execute(sql_qry).fetchall()
+        ddb_conn.execute(sql_qry)
 
         sql_qry = """
 -- ================================================================================================
@@ -604,7 +2387,7 @@ select
   ,Color
   ,JudicialOfficerCode
   ,DisplayOrder
-  ,strftime(SessionDate,'%U')::int as week
+  ,Week as week
 from
   tmp_courtsession
 order by
@@ -617,32 +2400,94 @@ order by
 """
         court_session_list = ddb_conn.execute(sql_qry).fetchall()
 
-        date_list = [s[0] for s in court_session_list]
-        for dt in date_range_generator(min(date_list),max(date_list)):
-            # Skip weekend dates.
-            if dt.isoweekday() <= 5:
-                date_sessions = [s for s in court_session_list if s[0] == dt and s[1] == '']
-                # From sorted list of all the sessions of the given week,
-                # clear those that are not in the current date's list. 
-                # For those that are, add any needed additional data, such as color.
-                for week_session in [ws for ws in week_sessions if ws[1] == int(dt.strftime("%U"))]:
-                    # Get matching date session to current week session, if exists.
-                    matching_date_session = None
-                    try:
-                        matching_date_session = next(
-                            date_session for date_session in date_sessions if week_session[0] == date_session[2]
-                        )
-                    except StopIteration:
-                        pass
-                    # Using SessionDescription
-                    if matching_date_session:
-                        # Add matching session with week session row_num to maintain order.
-                        # [SessionDate,StatrDate,SessionDescription,Color,JudicialOfficerCode,DisplayOrder,week,row_num]
-                        sessions.append(list(matching_date_session)+[week_session[2]])
-                    else:
-                        # Add blank session with week session row_num to maintain order.
-                        # [SessionDate,StatrDate='',SessionDescription='',Color='',JudicialOfficerCode='',DisplayOrder=,week,row_num]
-                        sessions.append([dt,'','','','',999,week_session[1],week_session[2]])
+        # Align each weekday's untimed (StartTime='') sessions to the sorted list of the
+        # unique untimed sessions of its week: the weekday calendar is joined to the week
+        # sessions, and the weekday's matching session, if any, is left joined to that.
+        # Week sessions without a matching session for the weekday become blank sessions
+        # (DisplayOrder=999), so each week session keeps its row_num position on every day.
+        # Weeks are keyed by year and week number so multi-year date ranges are aligned too.
+        sql_qry = """
+-- ================================================================================================
+with
+week_session as
+(
+  select
+    SessionDescription
+    ,Year
+    ,Week
+    ,row_number() over (order by Year,Week,DisplayOrder,SessionDescription) row_num
+  from
+    (
+      select distinct
+        SessionDescription
+        ,DisplayOrder
+        ,year(SessionDate) as Year
+        ,Week
+      from
+        tmp_courtsession
+      where
+        StartTime = ''
+    ) z
+)
+,weekday as
+(
+  select
+    Date as SessionDate
+    ,Year
+    ,Week
+  from
+    calendar_day
+  where
+    Date between (select min(SessionDate) from tmp_courtsession) and (select max(SessionDate) from tmp_courtsession)
+    and Workday
+)
+,date_session as
+(
+  select
+    SessionDate
+    ,StartTime
+    ,SessionDescription
+    ,Color
+    ,JudicialOfficerCode
+    ,DisplayOrder
+    ,row_number() over (
+      partition by SessionDate,SessionDescription
+      order by DisplayOrder,Color,JudicialOfficerCode
+    ) as n
+  from
+    tmp_courtsession
+  where
+    StartTime = ''
+)
+select
+  wd.SessionDate
+  ,'' as StartTime
+  ,coalesce(ds.SessionDescription,'') as SessionDescription
+  ,if(ds.SessionDate is null,'',ds.Color) as Color
+  ,if(ds.SessionDate is null,'',ds.JudicialOfficerCode) as JudicialOfficerCode
+  ,coalesce(ds.DisplayOrder,999) as DisplayOrder
+  ,wd.Week as week
+  ,ws.row_num
+from
+  weekday wd
+  inner join week_session ws
+  on
+    ws.Year = wd.Year
+    and ws.Week = wd.Week
+  left outer join date_session ds
+  on
+    ds.SessionDate = wd.SessionDate
+    and ds.SessionDescription = ws.SessionDescription
+    and ds.n = 1
+order by
+  wd.SessionDate
+  ,ws.row_num
+;
+-- ================================================================================================
+"""
+        # [SessionDate,StatrDate,SessionDescription,Color,JudicialOfficerCode,DisplayOrder,week,row_num]
+        for session in ddb_conn.execute(sql_qry).fetchall():
+            court_sessions.append(list(session))
 #    except CatalogException as e:
 #        logger.exception(f"\nAn error occurred: {e}")
     except Exception as e:
@@ -650,22 +2495,268 @@ order by
     finally:
         ddb_conn.close()
         logger.info("Succcessfully converted Dataframe to list.")
-    sessions += [list(s)+[9999] for s in court_session_list if s[1] != '']
-    return sessions
+    for s in court_session_list:
+        if s[1] != '':
+            court_sessions.append(list(s)+[9999])
+    return court_sessions
 #--------------------------------------------------------------------------------------------------
-def apply_abbreviations(sessions: list,yaml_config: dict) -> list:
-    abbreviation_keys = yaml_config['data']['abbreviation_keys']
+@functools.lru_cache(maxsize=8)
+def compile_abbreviations(abbreviation_keys: tuple) -> AbbreviationMatcher:
+    """
+    Returns the AbbreviationMatcher of the (phrase,abbreviation) pairs.
+    Cached, so the abbreviations are compiled once per configuration.
+    """
+    return AbbreviationMatcher(abbreviation_keys)
+#--------------------------------------------------------------------------------------------------
+def apply_abbreviations(sessions: CourtSessionIndex,yaml_config: dict) -> CourtSessionIndex:
+    matcher = compile_abbreviations(tuple(yaml_config['data']['abbreviation_keys'].items()))
     for session in sessions:
         # Only replace phase with abrev in sessions with non-empty session[1], i.e. StartTime=''.
         if session[1]:
-            for phrase,abbrev in abbreviation_keys.items():
-                if len(phrase) == 1 and not phrase.isalpha() and not phrase.isdigit() and not phrase.isspace():
-                    session[2].replace(phrase,abbrev)
-                elif phrase.lower() in session[2].lower():
-                    pattern = re.compile(re.escape(phrase), re.IGNORECASE)
-                    session[2] = pattern.sub(abbrev, session[2])
+            session[2] = matcher.apply(session[2])
     return sessions
 #--------------------------------------------------------------------------------------------------
+def get_month_grids(calendar_year: int, months: list, court_sessions: CourtSessionIndex, yaml_config: dict) -> dict:
+    """Returns the CalendarGrid of each month."""
+    return {month: CalendarGrid(calendar_year,month,court_sessions,yaml_config) for month in months}
+#--------------------------------------------------------------------------------------------------
+# The month sheets skeleton and styles of a month sheet worker process (see init_month_sheet_worker()).
+month_sheet_worker = {}
+#--------------------------------------------------------------------------------------------------
+def init_month_sheet_worker(skeleton: bytes, yaml_config: dict) -> None:
+    """Initializes a month sheet worker process with the pickled month sheets skeleton."""
+    wb = pickle.loads(skeleton)
+    restore_dimension_holders(wb)
+    month_sheet_worker['wb'] = wb
+    month_sheet_worker['styles'] = StyleRegistry(wb,yaml_config)
+    return None
+#--------------------------------------------------------------------------------------------------
+def render_month_sheet_part(calendar_year: int, month: int, month_sessions: CourtSessionIndex) -> MonthSheetPart:
+    """
+    Renders the month's sheet of the worker's skeleton, as write_calendar_grid() does in the
+    main process, and returns it serialized (worksheet XML).
+    """
+    wb = month_sheet_worker['wb']
+    styles = month_sheet_worker['styles']
+    ws = wb.worksheets[month-1]
+    cleanup_single_cell_merges(ws)
+    write_calendar_grid(ws,CalendarGrid(calendar_year,month,month_sessions,styles.yaml_config),styles)
+    writer = WorksheetWriter(ws)
+    writer.write()
+    xml = writer.read()
+    writer.cleanup()
+    return MonthSheetPart(month,xml,wb)
+#--------------------------------------------------------------------------------------------------
+def render_month_sheet_parts(wb: Workbook, calendar_year: int, months: list, court_sessions: CourtSessionIndex, yaml_config: dict, workers: int=1) -> dict:
+    """
+    Returns the MonthSheetPart of each month, rendered from the month sheets skeleton wb in a
+    pool of worker processes, each month from its slice of the court sessions.
+    Returns no parts with one worker, or if the pool fails: the months are then rendered in
+    this process.
+    """
+    if workers <= 1 or len(months) <= 1:
+        return {}
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(workers,len(months))
+            ,initializer=init_month_sheet_worker
+            ,initargs=(pickle.dumps(wb,protocol=pickle.HIGHEST_PROTOCOL),yaml_config)
+        ) as executor:
+            futures = {
+                month: executor.submit(
+                    render_month_sheet_part
+                    ,calendar_year
+                    ,month
+                    ,court_sessions.month_slice(calendar_year,month)
+                )
+                for month in months
+            }
+            return {month: future.result() for month,future in futures.items()}
+    except (OSError,BrokenProcessPool) as e:
+        logger.warning(f"Unable to render the month sheets in {workers} worker processes, rendering them in this process: {e}")
+        return {}
+#--------------------------------------------------------------------------------------------------
+def write_grid_row(ws: Worksheet, row_num: int, row: List[GridCell], cell_styles: GridCellStyles) -> None:
+    """Writes a row of a CalendarGrid to the worksheet's row row_num, and merges its merged cells."""
+    for col_idx,grid_cell in enumerate(row):
+        if grid_cell.merged and grid_cell.merge_end_col is None:
+            continue # Covered by the merge.
+        cell = ws.cell(row_num,col_idx+1)
+        cell.value = grid_cell.value
+        cell._style = copy.copy(cell_styles.style(grid_cell))
+        # Merge the cells.
+        # The merge copies the first cell's border to the edges of the merged range.
+        if grid_cell.merge_end_col is not None:
+            ws.merge_cells(
+                start_row=row_num
+                ,start_column=col_idx+1
+                ,end_row=row_num
+                ,end_column=grid_cell.merge_end_col+1
+            )
+    return None
+#--------------------------------------------------------------------------------------------------
+def write_calendar_grid(ws: Worksheet, grid: CalendarGrid, styles: StyleRegistry) -> None:
+    """
+    Writes the CalendarGrid to the worksheet, cell by cell with direct coordinates.
+    The grid's first row and the row below it are expected to be the workday and court_session
+    template rows of the sheet, whose styles are the base styles of the written cells.
+    Each cell gets a copy of one of a few StyleArrays interned by the StyleRegistry.
+    """
+    cell_styles = GridCellStyles(ws,grid.first_row,styles)
+    for row_idx,row in enumerate(grid.rows):
+        write_grid_row(ws,grid.first_row+row_idx,row,cell_styles)
+    return None
+#--------------------------------------------------------------------------------------------------
+def write_streaming_workbook(template_wb: Workbook, month_grids: dict, styles: StyleRegistry, previous_wb: Workbook=None) -> Workbook:
+    """
+    Returns a write-only workbook of the month sheets of template_wb, streamed row by row:
+    the months of month_grids from their grid, the grid rows of the other months copied from
+    previous_wb.
+    styles is the StyleRegistry of template_wb.
+    """
+    writer = StreamingWorkbookWriter(template_wb,styles)
+    for month,template_ws in enumerate(template_wb.worksheets,start=1):
+        if month in month_grids:
+            writer.write_month(template_ws,month_grids[month])
+        else:
+            writer.copy_sheet(template_ws,previous_wb.worksheets[month-1])
+    return writer.wb
+#--------------------------------------------------------------------------------------------------
+def build_sheet_skeleton(yaml_config: dict, calendar_year: int, debug_snapshots: bool=False) -> Workbook:
+    """
+    Returns a new workbook of the 12 month sheets, with their title, subtitle, workday header,
+    workday and court_session blocks of the YAML worksheet section, before any court session.
+    """
+    # Open a new workbook.
+    wb = Workbook()
+    # Shared style objects of the workbook.
+    styles = StyleRegistry(wb,yaml_config)
+    # Open the active worksheet. This would be the first of the new workbook.
+    ws = wb.active
+    cleanup_single_cell_merges(ws)
+    # Rename the worksheet
+    sheet_name = yaml_config['worksheet']['sheet_name']
+    ws.title = sheet_name.replace(
+        "${calendar_month_name}$"
+        ,calendar.month_name[1]
+    ).replace(
+        "${calendar_year}$"
+        ,str(calendar_year)
+    )
+    
+    # For each subkey of ['worksheet'], create the sheet's layout.
+    # Add:
+    #   Title
+    #   Subtitle
+    #   Cell Borders
+    for k,v in yaml_config['worksheet'].items():
+        if not isinstance(v,dict):
+            continue
+        logger.info(f"Creating: {k}")
+        top_left_cell = v['cell_range']['top_left_cell']
+        bottom_right_cell = v['cell_range']['bottom_right_cell']
+        min_row, min_col = coordinate_to_tuple(top_left_cell)
+        max_row, max_col = coordinate_to_tuple(bottom_right_cell)
+        merge_cells = v['cell_range']['merge_cells']
+        # Define font, fill color and border.
+        font = styles.font_spec(v['font'])
+        fill_color = styles.fill_spec(v['fill'])
+        border = styles.border_spec(v['border'])
+        alignment = styles.alignment(v['alignment']['horizontal'], v['alignment']['vertical'])
+        # Merge cells.
+        if merge_cells in ['ByColumn','ByBoth',]:
+            ws.merge_cells(f"{top_left_cell}:{bottom_right_cell}")
+            # Set text
+            ws[top_left_cell] = v['text'][0] if isinstance(v['text'],list) else v['text']
+            # Set font
+            ws[top_left_cell].font = font
+            # Set alignment.
+            ws[top_left_cell].alignment = alignment
+            # Set fill color.
+            ws[top_left_cell].fill = fill_color
+        else: # 'ByRow'
+            # Merge cells.
+            for i,col in enumerate(range(min_col,max_col+1)):
+                ws.merge_cells(
+                    start_row=min_row
+                    ,start_column=col
+                    ,end_row=max_row
+                    ,end_column=col
+                )
+                # Set text
+                ws.cell(row=min_row, column=col).value = v['text'][i]  if isinstance(v['text'],list) else v['text']
+                # Set font
+                ws.cell(row=min_row, column=col).font = font
+                # Set alignment.
+                ws.cell(row=min_row, column=col).alignment = alignment
+                # Set fill color.
+                ws.cell(row=min_row, column=col).fill = fill_color
+        # Add border
+        # You must apply the border to ALL cells in the merged range
+        # since a single cell's border won't cover the entire merged area.
+        for row in ws.iter_rows(min_row=min_row, min_col=min_col, max_row=max_row, max_col=max_col):
+            for cell in row:
+                cell.border = border
+        # Set column width
+        if v.get('column_width_inches',None) is not None:
+            # Set width of columns
+            cell_width = yaml_config['constants']['worksheet']['EXCEL_CELL_UNIT_PER_INCH'] * v['column_width_inches']
+            _, col_idx_left = coordinate_to_tuple(top_left_cell)
+            _, col_idx_right = coordinate_to_tuple(bottom_right_cell)
+            for col_idx in range(col_idx_left,col_idx_right+1):
+                ws.column_dimensions[get_column_letter(col_idx)].width = cell_width
+    
+    # Save workbook for debugging.
+    save_debug_snapshot(wb,"wb1.xlsx",debug_snapshots)
+    #sys.exit(0)
+    
+    #----------------------------------------------------------------------------------------------
+    # Open the active worksheet. This would be the first of the new workbook.
+    ws = wb.active
+    cleanup_single_cell_merges(ws)
+    # Copy worksheet for remaining months
+    yaml_config_ws_title = yaml_config['worksheet']['title']
+    title_top_left_cell = yaml_config_ws_title['cell_range']['top_left_cell']
+    title = yaml_config_ws_title['text'][0]  if isinstance(yaml_config_ws_title['text'],list) else yaml_config_ws_title['text']
+    yaml_config_ws_subtitle = yaml_config['worksheet']['subtitle']
+    subtitle_top_left_cell = yaml_config_ws_subtitle['cell_range']['top_left_cell']
+    subtitle = yaml_config_ws_subtitle['text'][0]  if isinstance(yaml_config_ws_subtitle['text'],list) else yaml_config_ws_subtitle['text']
+    superior_judges = yaml_config['data']['superior_judges']
+    judges_count = len(superior_judges)
+    if judges_count < 1:
+        raise Exception("'superior_judges' are not specified in YAML configuration file.")
+    for m in range(2,13):
+        # Copy worksheet
+        new_ws = wb.copy_worksheet(ws)
+        # Rename the new worksheet
+        new_ws.title = sheet_name.replace("${calendar_month_name}$",calendar.month_name[m]).replace("${calendar_year}$",str(calendar_year))
+        # Change title in sheet
+        new_ws[title_top_left_cell] = title.replace("${calendar_month_name}$",calendar.month_name[m]).replace("${calendar_year}$",str(calendar_year))
+        # Change subtitle in sheet
+        new_ws[subtitle_top_left_cell] = subtitle.replace("${superior_judge}$",superior_judges[m - judges_count*int((m-1)/judges_count) - 1]['name'])
+        #
+    # Change title in first (January) sheet
+    ws[title_top_left_cell] = title.replace("${calendar_month_name}$",calendar.month_name[1]).replace("${calendar_year}$",str(calendar_year))
+    # Change subtitle in first (January) sheet
+    ws[subtitle_top_left_cell] = subtitle.replace("${superior_judge}$",superior_judges[0]['name'])
+    
+    # Save workbook for debugging.
+    save_debug_snapshot(wb,"wb2.xlsx",debug_snapshots)
+    #sys.exit(0)
+    return wb
+#--------------------------------------------------------------------------------------------------
+def parse_months(months: str) -> set:
+    """Returns the months of the comma separated --months option (e.g. '3,4'), an empty set if None."""
+    if not months:
+        return set()
+    try:
+        forced_months = {int(month) for month in months.split(',')}
+    except ValueError:
+        raise typer.BadParameter(f"Months must be comma separated numbers: {months}",param_hint="'--months'")
+    if not forced_months <= set(range(1,13)):
+        raise typer.BadParameter(f"Months must be 1 to 12: {months}",param_hint="'--months'")
+    return forced_months
+#--------------------------------------------------------------------------------------------------
 #==================================================================================================
 def main(
     config_file: str = typer.Argument(
@@ -693,9 +2784,68 @@ def main(
             "Force load of YAML configuration file only."
         )
     )
+    ,legacy_layout: bool = typer.Option(
+        False
+        ,help=(
+            "Build the month sheets with the original stages that insert, delete, merge and swap "
+            "worksheet cells, instead of computing the layout with CalendarGrid."
+        )
+    )
+    ,debug_snapshots: bool = typer.Option(
+        False
+        ,help=(
+            "Save the workbook after each stage (wb1.xlsx .. wb9a.xlsx) for debugging."
+        )
+    )
+    ,offline: bool = typer.Option(
+        False
+        ,help=(
+            "Do not query Odyssey. Use the cached court sessions regardless of their age, "
+            "else the [Cache] offline_db database or the CSV exports in [Cache] offline_csv_folder."
+        )
+    )
+    ,refresh_cache: bool = typer.Option(
+        False
+        ,help=(
+            "Invalidate the cached court sessions of the calendar year before fetching them. "
+            "With --delta-sync, resync the calendar year's session store in full."
+        )
+    )
+    ,delta_sync: bool = typer.Option(
+        False
+        ,help=(
+            "Fetch only the court sessions created, changed or deleted since the last sync of the "
+            "calendar year into the local session store, and build from the store."
+        )
+    )
+    ,force_rebuild: bool = typer.Option(
+        False
+        ,help=(
+            "Build the workbook, all month sheets, even if a workbook built from the same court "
+            "sessions, configuration and code is in the workbook cache."
+        )
+    )
+    ,months: str = typer.Option(
+        None
+        ,help=(
+            "Comma separated months (e.g. 3,4) to render even if their court sessions and "
+            "special dates did not change since the previous workbook."
+        )
+    )
+    ,compression_level: int = typer.Option(
+        None
+        ,min=0
+        ,max=9
+        ,help=(
+            "Deflate level of the saved workbook, 0 (fastest, largest) to 9 (slowest, smallest). "
+            "Overrides [Save] compression_level, e.g. 1 for a quick preview."
+        )
+    )
 ):
     """
     """
+    # Usage errors are reported by typer, before the run starts.
+    forced_months = parse_months(months)
     try:
         # App initialization
         config = configparser.ConfigParser()
@@ -715,244 +2865,180 @@ def main(
             sys.exit()
         #  Data from YAML config
         calendar_year = yaml_config['data'].get('calendar_year',calendar_year)
+        calendar_dimension = get_calendar_dimension(calendar_year)
 ###        MAX_ROW = yaml_config['constants']['worksheet']['MAX_ROW']
         
+        #------------------------------------------------------------------------------------------
+        # Get the courts sessions from Odyssey DB for the calendar year.
+        court_sessions_df = get_court_sessions(
+            calendar_year
+            ,config
+            ,offline=offline
+            ,refresh_cache=refresh_cache
+            ,delta_sync=delta_sync
+        )
+        # Done if the workbook of the same court sessions, configuration, code and [Save] settings was built already.
+        # (Debug snapshots need a build.)
+        workbook_name = f"{Path(__file__).stem}.xlsx"
+        workbook_cache = WorkbookCache.from_config(config)
+        packager = XlsxPackager.from_config(config,compression_level)
+        run_fingerprint = get_run_fingerprint(court_sessions_df,yaml_config,calendar_year,legacy_layout,packager.output_settings)
+        if not (force_rebuild or debug_snapshots or forced_months) and workbook_cache.restore(run_fingerprint,workbook_name):
+            return None
+        
         #------------------------------------------------------------------------------------------
         debugging_skip_code = False
         #------------------------------------------------------------------------------------------
         if not debugging_skip_code:
-            # Open a new workbook.
-            wb = Workbook()
-            # Open the active worksheet. This would be the first of the new workbook.
-            ws = wb.active
-            cleanup_single_cell_merges(ws)
-            # Rename the worksheet
-            sheet_name = yaml_config['worksheet']['sheet_name']
-            ws.title = sheet_name.replace(
-                "${calendar_month_name}$"
-                ,calendar.month_name[1]
-            ).replace(
-                "${calendar_year}$"
-                ,str(calendar_year)
-            )
-            
-            # For each subkey of ['worksheet'], create the sheet's layout.
-            # Add:
-            #   Title
-            #   Subtitle
-            #   Cell Borders
-            for k,v in yaml_config['worksheet'].items():
-                if not isinstance(v,dict):
-                    continue
-                logger.info(f"Creating: {k}")
-                top_left_cell = v['cell_range']['top_left_cell']
-                bottom_right_cell = v['cell_range']['bottom_right_cell']
-                min_row, min_col = coordinate_to_tuple(top_left_cell)
-                max_row, max_col = coordinate_to_tuple(bottom_right_cell)
-                merge_cells = v['cell_range']['merge_cells']
-                # Define font
-                font = Font(
-                    name=v['font']['name'],             # Font type/family
-                    size=v['font']['size'],             # Font size (points)
-                    bold=v['font']['bold'],             # Optional: Make text bold
-                    italic=v['font']['italic'],         # Optional: Make text italic
-                    color=yaml_config['constants']['colors'][v['font']['color']]  # Font color (Hex code - FF0000 is Red)
-                )
-                # Define fill color
-                fill_color = PatternFill(
-                    start_color=yaml_config['constants']['colors'][v['fill']['start_color']], 
-                    end_color=yaml_config['constants']['colors'][v['fill']['end_color']], 
-                    fill_type=v['fill']['fill_type']
-                )
-                # Define border
-                border = Border(
-                    left=Side(
-                        style=v['border']['left']['style'], 
-                        color=yaml_config['constants']['colors'][v['border']['left']['color']]
-                    ), 
-                    right=Side(
-                        style=v['border']['right']['style'], 
-                        color=yaml_config['constants']['colors'][v['border']['right']['color']]
-                    ), 
-                    top=Side(
-                        style=v['border']['top']['style'], 
-                        color=yaml_config['constants']['colors'][v['border']['top']['color']]
-                    ), 
-                    bottom=Side(
-                        style=v['border']['bottom']['style'], 
-                        color=yaml_config['constants']['colors'][v['border']['bottom']['color']]
-                    ) 
-                )
-                # Merge cells.
-                if merge_cells in ['ByColumn','ByBoth',]:
-                    ws.merge_cells(f"{top_left_cell}:{bottom_right_cell}")
-                    # Set text
-                    ws[top_left_cell] = v['text'][0] if isinstance(v['text'],list) else v['text']
-                    # Set font
-                    ws[top_left_cell].font = font
-                    # Set alignment.
-                    ws[top_left_cell].alignment = Alignment(
-                        horizontal=v['alignment']['horizontal']
-                        ,vertical=v['alignment']['vertical']
-                        ,wrapText=True
-                    )
-                    # Set fill color.
-                    ws[top_left_cell].fill = fill_color
-                else: # 'ByRow'
-                    # Merge cells.
-                    for i,col in enumerate(range(min_col,max_col+1)):
-                        ws.merge_cells(
-                            start_row=min_row
-                            ,start_column=col
-                            ,end_row=max_row
-                            ,end_column=col
-                        )
-                        # Set text
-                        ws.cell(row=min_row, column=col).value = v['text'][i]  if isinstance(v['text'],list) else v['text']
-                        # Set font
-                        ws.cell(row=min_row, column=col).font = font
-                        # Set alignment.
-                        ws.cell(row=min_row, column=col).alignment = Alignment(
-                            horizontal=v['alignment']['horizontal']
-                            ,vertical=v['alignment']['vertical']
-                            ,wrapText=True
-                        )
-                        # Set fill color.
-                        ws.cell(row=min_row, column=col).fill = fill_color
-                # Add border
-                # You must apply the border to ALL cells in the merged range
-                # since a single cell's border won't cover the entire merged area.
-                for row in ws.iter_rows(min_row=min_row, min_col=min_col, max_row=max_row, max_col=max_col):
-                    for cell in row:
-                        cell.border = border
-                # Set column width
-                if v.get('column_width_inches',None) is not None:
-                    # Set width of columns
-                    cell_width = yaml_config['constants']['worksheet']['EXCEL_CELL_UNIT_PER_INCH'] * v['column_width_inches']
-                    _, col_idx_left = coordinate_to_tuple(top_left_cell)
-                    _, col_idx_right = coordinate_to_tuple(bottom_right_cell)
-                    for col_idx in range(col_idx_left,col_idx_right+1):
-                        ws.column_dimensions[get_column_letter(col_idx)].width = cell_width
-            
-            # Save workbook for debugging.
-            xlsx_filename = "wb1.xlsx"
-            wb.save(xlsx_filename)
-            #sys.exit(0)
+            # The month sheets, from the skeleton cache if their YAML styling and year were built
+            # before. (Debug snapshots need a build.)
+            skeleton_cache = SkeletonCache.from_config(config)
+            skeleton_fingerprint = get_skeleton_fingerprint(yaml_config,calendar_year)
+            wb = None if debug_snapshots else skeleton_cache.load(skeleton_fingerprint)
+            if wb is None:
+                wb = build_sheet_skeleton(yaml_config,calendar_year,debug_snapshots)
+                skeleton_cache.put(skeleton_fingerprint,wb)
+            # Shared style objects of the workbook.
+            styles = StyleRegistry(wb,yaml_config)
             
         #------------------------------------------------------------------------------------------
-        if not debugging_skip_code:
-            workbook_name = "wb1.xlsx"
-            wb = load_workbook(workbook_name)
-            # Open the active worksheet. This would be the first of the new workbook.
-            ws = wb.active
-            cleanup_single_cell_merges(ws)
-            # Copy worksheet for remaining months
-            yaml_config_ws_title = yaml_config['worksheet']['title']
-            title_top_left_cell = yaml_config_ws_title['cell_range']['top_left_cell']
-            title = yaml_config_ws_title['text'][0]  if isinstance(yaml_config_ws_title['text'],list) else yaml_config_ws_title['text']
-            yaml_config_ws_subtitle = yaml_config['worksheet']['subtitle']
-            subtitle_top_left_cell = yaml_config_ws_subtitle['cell_range']['top_left_cell']
-            subtitle = yaml_config_ws_subtitle['text'][0]  if isinstance(yaml_config_ws_subtitle['text'],list) else yaml_config_ws_subtitle['text']
-            superior_judges = yaml_config['data']['superior_judges']
-            judges_count = len(superior_judges)
-            if judges_count < 1:
-                raise Exception("'superior_judges' are not specified in YAML configuration file.")
-            for m in range(2,13):
-                # Copy worksheet
-                new_ws = wb.copy_worksheet(ws)
-                # Rename the new worksheet
-                new_ws.title = sheet_name.replace("${calendar_month_name}$",calendar.month_name[m]).replace("${calendar_year}$",str(calendar_year))
-                # Change title in sheet
-                new_ws[title_top_left_cell] = title.replace("${calendar_month_name}$",calendar.month_name[m]).replace("${calendar_year}$",str(calendar_year))
-                # Change subtitle in sheet
-                new_ws[subtitle_top_left_cell] = subtitle.replace("${superior_judge}$",superior_judges[m - judges_count*int((m-1)/judges_count) - 1]['name'])
-                #
-            # Change title in first (January) sheet
-            ws[title_top_left_cell] = title.replace("${calendar_month_name}$",calendar.month_name[1]).replace("${calendar_year}$",str(calendar_year))
-            # Change subtitle in first (January) sheet
-            ws[subtitle_top_left_cell] = subtitle.replace("${superior_judge}$",superior_judges[0]['name'])
+        # Convert the courts sessions for the calendar year, plus the special_dates.
+        court_sessions = convert_df_to_list(
+            court_sessions_df
+            ,yaml_config
+            ,db_path=config.get('Cache','calendar_db',fallback='') or ':memory:'
+            ,cache=CourtSessionCache.from_config(config)
+        )
+        court_sessions = apply_abbreviations(court_sessions,yaml_config)
+        
+        #------------------------------------------------------------------------------------------
+        # With [Cache] incremental_months (or --months), only render the months whose court
+        # sessions, special dates or configuration changed since the previous workbook (see
+        # get_month_digests()), and the forced months. The sheets of the other months are
+        # copied from the previous workbook.
+        month_digests = get_month_digests(court_sessions,yaml_config,calendar_year,legacy_layout)
+        previous_wb, previous_digests = (None,{})
+        incremental_months = config.getboolean('Cache','incremental_months',fallback=False) or forced_months
+        if incremental_months and not (force_rebuild or debug_snapshots):
+            previous_wb, previous_digests = load_previous_workbook(workbook_name,wb.sheetnames)
+        render_months = [
+            month for month in range(1,13)
+            if previous_digests.get(month) != month_digests[month] or month in forced_months
+        ]
+        if previous_wb is not None:
+            logger.info(f"Rendering months {render_months}, the others are unchanged in: {workbook_name}")
+        # [Render] renderer: workbook (openpyxl in-memory workbook) or streaming (write-only workbook).
+        streaming = config.get('Render','renderer',fallback='workbook') == 'streaming'
+        if streaming and (legacy_layout or debug_snapshots):
+            logger.warning("The streaming renderer does not support --legacy-layout or --debug-snapshots, using the workbook renderer.")
+            streaming = False
+        
+        #------------------------------------------------------------------------------------------
+        month_sheet_parts = {}
+        if not legacy_layout:
+            # With [Render] workers > 1, the month sheets are rendered and serialized in worker
+            # processes, their XML is written when the workbook is saved (see MonthSheetPart).
+            # The streaming renderer and the debug snapshots need the sheets in wb.
+            if not (streaming or debug_snapshots):
+                month_sheet_parts = render_month_sheet_parts(
+                    wb
+                    ,calendar_year
+                    ,render_months
+                    ,court_sessions
+                    ,yaml_config
+                    ,workers=config.getint('Render','workers',fallback=1)
+                )
+            # For each other sheet (month) compute the month days and court sessions layout,
+            # and write it to the sheet in one pass.
+            month_grids = get_month_grids(
+                calendar_year
+                ,[month for month in render_months if month not in month_sheet_parts]
+                ,court_sessions
+                ,yaml_config
+            )
+            # With the streaming renderer, the grids are written when the workbook is saved.
+            for month in month_grids:
+                # Select the worksheet by index.
+                ws = wb.worksheets[month-1]
+                cleanup_single_cell_merges(ws)
+                if not streaming:
+                    write_calendar_grid(ws,month_grids[month],styles)
             
             # Save workbook for debugging.
-            xlsx_filename = "wb2.xlsx"
-            wb.save(xlsx_filename)
-            #sys.exit(0)
+            save_debug_snapshot(wb,"wb9a.xlsx",debug_snapshots)
             
         #------------------------------------------------------------------------------------------
-        if not debugging_skip_code:
-            workbook_name = "wb2.xlsx"
-            wb = load_workbook(workbook_name)
+        if legacy_layout and not debugging_skip_code:
             # For each sheet (month) set up month days and placeholders for court sessions.
             # The month day cells are indicated by '${calendar_day}$ placeholder.
             month_day_placeholder = '${calendar_day}$'  ### put in yaml_config
-            for month in range(1,13):
+            for month in render_months:
                 # Select the worksheet by index.
                 ws = wb.worksheets[month-1]
                 cleanup_single_cell_merges(ws)
-                month_num_days = calendar.monthrange(calendar_year, month)[1]
+                cell_index = CellValueIndex(ws,{month_day_placeholder})
+                month_num_days = calendar_dimension.month_num_days[month]
+                month_start = calendar_dimension.month_start[month]
                 monthday = 0 # Controls month loop.
                 for month_day in range(1,month_num_days+1):
-                    if month_day < monthday or get_weekday_number(calendar_year,month,month_day) > 5:
+                    if month_day < monthday or not calendar_dimension.workday[month_start+month_day-1]:
                         continue
                     # Locate top left month day placeholder.
-                    row_num = find_first_matching_cell(ws,'A',month_day_placeholder)
+                    row_num = cell_index.find(1,month_day_placeholder)
                     if row_num is None:
                         raise Exception("Unable to locate top left month day placeholder. {month=}, {month_day=}")
                     # Add another week of rows to the sheet.
-                    ws.insert_rows(row_num+2, amount=2)
+                    cell_index.insert_rows(row_num+2, amount=2)
                     # Copy cells to new rows.
                     for row in range(row_num,row_num+2):
                         for col in range(1,6):
-                            copy_cell(ws.cell(row,col),ws.cell(row+2,col))
+                            cell_index.copy_cell(ws.cell(row,col),ws.cell(row+2,col))
                     # Get the next month_day that is a workday.
-                    if (workday := get_weekday_number(calendar_year,month,month_day)) > 5: # >= Friday
+                    if (workday := calendar_dimension.weekday[month_start+month_day-1]) > 5: # >= Friday
                         continue
                     # For the current week, set workday cell value to month_day if workday is has a month day. Else clear it.
                     monthday = month_day
                     for cell_workday in range(1,6):
-                        cell = ws.cell(row_num,cell_workday)
                         if cell_workday < workday or monthday > month_num_days:
                             cell_value = 'Empty'
                         else:
                             cell_value = monthday
                             monthday += 1
-                        cell.value = cell_value
+                        cell_index.set_value(row_num,cell_workday,cell_value)
                     if monthday+2 > month_num_days: # account for Sat & Sun
                         # Cleanup, Remove unneeded row.
                         row_num += 2
-                        ws.delete_rows(row_num, amount=2)
+                        cell_index.delete_rows(row_num, amount=2)
                         break
                 #break # month loop
             
             # Save workbook for debugging.
-            xlsx_filename = "wb3.xlsx"
-            wb.save(xlsx_filename)
-            wb = load_workbook(xlsx_filename)
+            save_debug_snapshot(wb,"wb3.xlsx",debug_snapshots)
             
         #------------------------------------------------------------------------------------------
-        if not debugging_skip_code:
-            workbook_name = "wb3.xlsx"
-            wb = load_workbook(workbook_name)
+        if legacy_layout and not debugging_skip_code:
             # There are now month day cells that contain the value "Empty". 
             # Locate these cell and set the font color to the same as the cell's fill color
             # so to "hide" the content.
-            for month in range(1,13):
+            for month in render_months:
                 # Select the worksheet by index.
                 ws = wb.worksheets[month-1]
                 cleanup_single_cell_merges(ws)
                 # For each column, locate the cells whose value is "Empty" 
                 # and then set its cell font color to the same as its fill color.
-                # (NOTE: This had to be done after reloading the workbook from a file
-                # because doing this in the previous loop code the cell font and fill 
-                # settings seem to be tied when copied.
+                # (NOTE: This used to need a save/reload of the workbook because the cell font
+                # and fill settings seemed to be tied when copied. copy_cell() now gives each
+                # copied cell its own StyleArray, so the live workbook is used.)
+                cell_index = CellValueIndex(ws,{"Empty"})
                 for col in range(1,6):
-                    # Locate the court session placeholder.
+                    # Locate the "Empty" cells.
                     row_num = 0
-                    while (row_num := find_first_matching_cell_by_col_idx(ws,col,"Empty",start_row=row_num+1)):
+                    while (row_num := cell_index.find(col,"Empty",start_row=row_num+1)):
                         # Set the font color to same as fill to hide the text.
                         cell = ws.cell(row_num,col)
                         fill = cell.fill
                         font = cell.font
-                        cell.font = Font(
+                        cell.font = styles.font(
                             name=font.name
                             ,size=font.size
                             ,bold=font.bold
@@ -962,37 +3048,34 @@ def main(
                             ,color=fill.fgColor.rgb  
                         )
             # Save workbook for debugging.
-            xlsx_filename = "wb3a.xlsx"
-            wb.save(xlsx_filename)
-            wb = load_workbook(xlsx_filename)
+            save_debug_snapshot(wb,"wb3a.xlsx",debug_snapshots)
             
         #------------------------------------------------------------------------------------------
-        if not debugging_skip_code:
-            workbook_name = "wb3a.xlsx"
-            wb = load_workbook(workbook_name)
-            # Get the courts sessions from Odyssey DB for the calendar year,
-            # plus the special_dates.
-            court_sessions_df = get_odyssey_court_sessions_by_year(calendar_year,config)
-            court_session_list = convert_df_to_list(court_sessions_df,yaml_config)
-            court_session_list = apply_abbreviations(court_session_list,yaml_config)
+        if legacy_layout and not debugging_skip_code:
             # For each sheet (month) add court sessions to the month_days.
             # The month day sessions cells are indicated by '${calendar_day}$' placeholder.
             court_session_placeholder = '${court_session}$'  ### put in yaml_config
-            for month in range(1,13):
+            # The color of each court session cell, by month and (row,col).
+            # Applied to the cells once the layout is done.
+            session_colors = {}
+            for month in render_months:
                 # Select the worksheet by index.
                 ws = wb.worksheets[month-1]
                 cleanup_single_cell_merges(ws)
-                month_num_days = calendar.monthrange(calendar_year, month)[1]
+                session_colors[month] = {}
+                cell_index = CellValueIndex(ws,{court_session_placeholder},cell_colors=session_colors[month])
+                month_num_days = calendar_dimension.month_num_days[month]
+                month_start = calendar_dimension.month_start[month]
                 for month_day in range(1,month_num_days+1):
                     # Get the workday for the month_day.
                     # Continue, if a weekend.
-                    workday = get_weekday_number(calendar_year,month,month_day)
-                    if workday > 5:
+                    if not calendar_dimension.workday[month_start+month_day-1]:
                         continue
+                    workday = calendar_dimension.column[month_start+month_day-1]
                     # Locate the month in the work_day column.
-                    row_num = find_first_matching_cell_by_col_idx(ws,workday,month_day)
+                    row_num = cell_index.find(workday,month_day)
                     # Locate the court session placeholder.
-                    row_num = find_first_matching_cell_by_col_idx(ws,workday,court_session_placeholder,start_row=row_num)
+                    row_num = cell_index.find(workday,court_session_placeholder,start_row=row_num)
                     if row_num is None:
                         logger.error(f"{month=},{month_day=},{workday=},{row_num=},{day_sessions=}")
                         wb.save("wb-error.xlsx")
@@ -1001,10 +3084,10 @@ def main(
                     # Clear row cells leading up to the month_day's workday if they contain court_session_placeholder.
                     for wd in range(1,workday):
                         if ws.cell(row_num,wd).value == court_session_placeholder:
-                            ws.cell(row_num,wd).value = None
+                            cell_index.set_value(row_num,wd,None)
                     if month_day > month_num_days:
                         break # Break to next month
-                    day_sessions = [row for row in court_session_list if row[0] == datetime.strptime(f'{calendar_year}-{month:02d}-{month_day:02d}','%Y-%m-%d').date()]
+                    day_sessions = court_sessions.day_sessions(calendar_dimension.dates[month_start+month_day-1])
                     if day_sessions:
                         # For the current month_day, add its court_sessions.
                         day_row_num = 0
@@ -1013,34 +3096,35 @@ def main(
                             # then add a new row of placeholders.
                             if ws.cell(row_num+day_row_num+1,workday).value != court_session_placeholder:
                                 # Add court session another row to the sheet.
-                                ws.insert_rows(row_num+day_row_num+1, amount=1)
+                                cell_index.insert_rows(row_num+day_row_num+1, amount=1)
                                 # Copy cells to new rows.
                                 # This copies the court placeholders from the previous cells.
                                 # This row will have just the court session placeholder in each cell. (Could just set the cell values to the placeholder???)
                                 for col in range(1,6):
-                                    copy_cell(ws.cell(row_num+day_row_num,col),ws.cell(row_num+day_row_num+1,col))
+                                    cell_index.copy_cell(ws.cell(row_num+day_row_num,col),ws.cell(row_num+day_row_num+1,col))
                             session_description, color_name, judicial_officer = day_session[2],day_session[3],day_session[4]
-                            session_cell = ws.cell(row_num+day_row_num,workday)
                             if color_name:
                                 new_color = get_yaml_config_color(yaml_config,color_name)
                             else:
                                 new_color = get_yaml_config_color(yaml_config,'Black')
-                            # Add the color to the value to be used later.
+                            # Record the color in session_colors to be applied later.
                             # Trying to add the color now, when cells are being inserted and copied
                             # seems to cause the colors to be incorrect in the result.
-                            if session_description:
-                                session_cell.value = f"{session_description}-[{new_color}]"
-                            else:
-                                session_cell.value = session_description
+                            cell_index.set_value(
+                                row_num+day_row_num
+                                ,workday
+                                ,session_description
+                                ,color=new_color if session_description else None
+                            )
                             day_row_num += 1
                         row_num += day_row_num
                     # All day sessions, if any, have been added.
                     # Clear the day's remaining session placeholders
-                    while row := find_first_matching_cell_by_col_idx(ws,workday,court_session_placeholder):
+                    while row := cell_index.find(workday,court_session_placeholder):
                         # row must be same or adjacent to row_num.
                         if row and 0 <= (row - row_num) <= 1:
                             row_num = row
-                            ws.cell(row_num,workday).value = None
+                            cell_index.set_value(row_num,workday,None)
                         else:
                             break
                     if 1==0 and month_day > 13: # test code to stop early.
@@ -1048,19 +3132,15 @@ def main(
                 #break # month loop
                  
             # Save workbook for debugging.
-            xlsx_filename = "wb4.xlsx"
-            wb.save(xlsx_filename)
-            wb = load_workbook(xlsx_filename)
+            save_debug_snapshot(wb,"wb4.xlsx",debug_snapshots)
             
         #------------------------------------------------------------------------------------------
-        if not debugging_skip_code:
-            workbook_name = "wb4.xlsx"
-            wb = load_workbook(workbook_name)
+        if legacy_layout and not debugging_skip_code:
             # For each month (sheet):
             #   - Remove all court session placeholders.
             #   - Remove all blank rows.
             #   - Add Border to last row.
-            for month in range(1,13):
+            for month in render_months:
                 # Select the worksheet by index.
                 ws = wb.worksheets[month-1]
                 cleanup_single_cell_merges(ws)
@@ -1071,46 +3151,33 @@ def main(
                         if ws.cell(row,col).value == court_session_placeholder:
                             ws.cell(row,col).value = ""
                 # Remove all blank rows.
+                merged_index = MergedCellIndex(ws)
+                blank_rows = set()
                 for row in range(ws.max_row+1,2,-1): #range(1,ws.max_row+2)
                     blank_row = True
                     for col in range(1,6):
                         if not (not ws.cell(row,col).value or ws.cell(row,col).value == ""):
                             blank_row = False
                             break
-                    # Remove blank rows.
-                    if blank_row and not ws.cell(row,1).coordinate in ws.merged_cells:
-                        ws.delete_rows(row, amount=1)
+                    if blank_row and not merged_index.is_merged(row,1):
+                        blank_rows.add(row)
+                # Remove blank rows, all at once.
+                row_map = compact_rows(ws,blank_rows)
+                session_colors[month] = {
+                    (row_map[row],col): color
+                    for (row,col),color in session_colors[month].items()
+                    if row in row_map
+                }
 
             # Save workbook for debugging.
-            xlsx_filename = "wb5.xlsx"
-            wb.save(xlsx_filename)
+            save_debug_snapshot(wb,"wb5.xlsx",debug_snapshots)
             
         #------------------------------------------------------------------------------------------
-        if not debugging_skip_code:
-            workbook_name = "wb5.xlsx"
-            wb = load_workbook(workbook_name)
+        if legacy_layout and not debugging_skip_code:
             # Add Border to last row having data.
-            for month in range(1,13):
+            for month in render_months:
                 # Define border
-                cs_border = yaml_config['worksheet']['court_session']['border']
-                last_border = Border(
-                    left=Side(
-                        style=cs_border['left']['style'], 
-                        color=yaml_config['constants']['colors'][cs_border['left']['color']]
-                    ), 
-                    right=Side(
-                        style=cs_border['right']['style'], 
-                        color=yaml_config['constants']['colors'][cs_border['right']['color']]
-                    ), 
-                    top=Side(
-                        style=cs_border['top']['style'], 
-                        color=yaml_config['constants']['colors'][cs_border['top']['color']]
-                    ), 
-                    bottom=Side(
-                        style='thick', 
-                        color=yaml_config['constants']['colors'][cs_border['bottom']['color']]
-                    ) 
-                )
+                last_border = styles.border_spec(yaml_config['worksheet']['court_session']['border'], bottom='thick')
                 # Select the worksheet by index.
                 ws = wb.worksheets[month-1]
                 cleanup_single_cell_merges(ws)
@@ -1134,62 +3201,48 @@ def main(
                     ws.cell(border_row,col).border = copy.copy(last_border)
 
             # Save workbook for debugging.
-            xlsx_filename = "wb6.xlsx"
-            wb.save(xlsx_filename)
+            save_debug_snapshot(wb,"wb6.xlsx",debug_snapshots)
             
         #------------------------------------------------------------------------------------------
-        if not debugging_skip_code:
-            workbook_name = "wb6.xlsx"
-            wb = load_workbook(workbook_name)
+        if legacy_layout and not debugging_skip_code:
             # For each sheet (month) look for adjacent cells in each row that have the same content and
             # if cell.value not blank/None or starts with a number, then merge the cells.
-            for month in range(1,13):
+            # Cells only match if their session colors match too.
+            for month in render_months:
                 ws = wb.worksheets[month-1]
                 cleanup_single_cell_merges(ws)
+                cell_colors = session_colors[month]
                 for row in range(7,ws.max_row+1):
                     first_cell_in_merge = None
                     last_cell_in_merge = None
                     for col in range(2,6):
-                        if ws.cell(row,col).value == "9:00 ST CR - Pleas (D)-[FF00B050]": # test code
-                            pass
+                        same_as_previous = (
+                            ws.cell(row,col).value == ws.cell(row,col-1).value
+                            and cell_colors.get((row,col)) == cell_colors.get((row,col-1))
+                        )
                         if (
                                 ws.cell(row,col).value
                                 and ws.cell(row,col).value != "Empty"
                                 and str(ws.cell(row,col).value)[0] not in "1234567890" 
-                                and ws.cell(row,col).value == ws.cell(row,col-1).value
+                                and same_as_previous
                             ):
                             if first_cell_in_merge is None:
                                 first_cell_in_merge = ws.cell(row,col-1)
                                 # Set the font of the first_cell_in_merge.
-                                first_cell_in_merge.alignment = Alignment(
-                                    horizontal='center'
-                                    ,vertical='center'
-                                    ,wrapText=True
-                                )
+                                first_cell_in_merge.alignment = styles.alignment('center', 'center')
                                 #first_cell_in_merge.fill = yellow_fill = PatternFill(start_color='FFFFFF00', end_color='FFFFFF00', fill_type='solid')
                             last_cell_in_merge = ws.cell(row,col)
-                        if col == 5 or ws.cell(row,col).value and ws.cell(row,col).value != ws.cell(row,col-1).value:
+                        if col == 5 or ws.cell(row,col).value and not same_as_previous:
                             if first_cell_in_merge and last_cell_in_merge:
                                 # Merge the cells
                                 ws.merge_cells(f"{first_cell_in_merge.coordinate}:{last_cell_in_merge.coordinate}")
                                 # Define border
-                                border = Border(
-                                    left=Side(
-                                        style='thick', 
-                                        color=get_yaml_config_color(yaml_config,'Black')
-                                    ), 
-                                    right=Side(
-                                        style='thick', 
-                                        color=get_yaml_config_color(yaml_config,'Black')
-                                    ), 
-                                    top=Side(
-                                        style='thick', 
-                                        color=get_yaml_config_color(yaml_config,'Black')
-                                    ), 
-                                    bottom=Side(
-                                        style='thick', 
-                                        color=get_yaml_config_color(yaml_config,'Black')
-                                    ) 
+                                black = get_yaml_config_color(yaml_config,'Black')
+                                border = styles.border(
+                                    left=('thick',black)
+                                    ,right=('thick',black)
+                                    ,top=('thick',black)
+                                    ,bottom=('thick',black)
                                 )
                                 # Add border
                                 # You must apply the border to ALL cells in the merged range
@@ -1206,133 +3259,82 @@ def main(
                                 last_cell_in_merge = None
 
             # Save workbook for debugging.
-            xlsx_filename = "wb7.xlsx"
-            wb.save(xlsx_filename)
+            save_debug_snapshot(wb,"wb7.xlsx",debug_snapshots)
             
         #------------------------------------------------------------------------------------------
-        if not debugging_skip_code:
-            workbook_name = "wb7.xlsx"
-            wb = load_workbook(workbook_name)
+        if legacy_layout and not debugging_skip_code:
             # For each sheet (month) set the color for each court session cell.
             # If cell value does not start with a digit, then set the color as the background 
             # and add thick border.
             # Else, set the color of the font.
             #
-            # The color has been embeded it the content of the cell, such as:
-            #   NEW YEAR'S DAY-[FFFFFFFF]
-            # It is removed.
-            extraction_pattern = r'-\[([^\]]+)\]'
-            pattern_to_remove = r'-\[.*?\]'
-            for month in range(1,13):
+            # The colors were recorded in session_colors when the court sessions were added.
+            # Cells covered by a merge have no value and are skipped.
+            for month in render_months:
                 ws = wb.worksheets[month-1]
                 cleanup_single_cell_merges(ws)
-                for row in range(1,ws.max_row+1):
-                    for col in range(1,6):
-                        cell = ws.cell(row,col)
-                        s = str(cell.value)
-                        match = re.search(extraction_pattern,s)
-                        result_removed = re.sub(pattern_to_remove,'',s)
-                        if match:
-                            # Group 1 (the content inside the parentheses) holds the desired substring
-                            new_color = match.group(1)
+                for (row,col),new_color in session_colors[month].items():
+                    cell = ws.cell(row,col)
+                    if cell.value is None:
+                        continue
+                    if new_color:
+                        font = cell.font
+                        if str(cell.value)[0] not in "1234567890": #cell.coordinate in ws.merged_cells:
+                            cell.fill = styles.fill(new_color)
+                            cell.font = styles.font(
+                                name=font.name
+                                ,size=10 #font.size
+                                ,bold=True
+                                ,italic=font.italic
+                                ,underline=font.underline
+                                ,strike=font.strike
+                                ,color=None  
+                            )
+                            cell.alignment = styles.alignment('center', 'center')  ## This should come from yaml_config???
+                            border = cell.border
+                            cell.border = styles.border(
+                                left=('thick',border.left.color)
+                                ,right=('thick',border.right.color)
+                                ,top=('thick',border.top.color)
+                                ,bottom=('thick',border.bottom.color)
+                            )
                         else:
-                            new_color = None
-                        if new_color:
-                            font = cell.font
-                            if str(cell.value)[0] not in "1234567890": #cell.coordinate in ws.merged_cells:
-                                cell.fill = PatternFill(start_color=new_color, end_color=new_color, fill_type='solid')
-                                cell.font = Font(
-                                    name=font.name
-                                    ,size=10 #font.size
-                                    ,bold=True
-                                    ,italic=font.italic
-                                    ,underline=font.underline
-                                    ,strike=font.strike
-                                    ,color=None  
-                                )
-                                cell.alignment = Alignment(
-                                    horizontal='center'
-                                    ,vertical='center'
-                                    ,wrapText=True
-                                )  ## This should come from yaml_config???
-                                border = cell.border
-                                cell.border = Border(
-                                    left=Side(style='thick', color=border.left.color)
-                                    ,right=Side(style='thick', color=border.right.color)
-                                    ,top=Side(style='thick', color=border.top.color)
-                                    ,bottom=Side(style='thick', color=border.bottom.color)
-                                )
-                            else:
-                                cell.font = Font(
-                                    name=font.name
-                                    ,size=font.size
-                                    ,bold=font.bold
-                                    ,italic=font.italic
-                                    ,underline=font.underline
-                                    ,strike=font.strike
-                                    ,color=new_color  # Only this property is changed
-                                )
-                            cell.value = result_removed
+                            cell.font = styles.font(
+                                name=font.name
+                                ,size=font.size
+                                ,bold=font.bold
+                                ,italic=font.italic
+                                ,underline=font.underline
+                                ,strike=font.strike
+                                ,color=new_color  # Only this property is changed
+                            )
 
-            # Save the workbook.
-            workbook_name = "wb8.xlsx"
-            logger.info(f"Saving workbook: {workbook_name}")
-            wb.save(workbook_name)
+            # Save workbook for debugging.
+            save_debug_snapshot(wb,"wb8.xlsx",debug_snapshots)
 
         #------------------------------------------------------------------------------------------
-        if not debugging_skip_code:
-            workbook_name = "wb8.xlsx"
-            wb = load_workbook(workbook_name)
+        if legacy_layout and not debugging_skip_code:
             # Remove all empty cells where possible.
-            # Loop through all cells on each month sheet.
-            # If non-merged and empty (value=None or '') then find first non-merged/non-empty/non-month day cell below in same column
-            # and Copy/Paste that cell into the empty cell, then empty the copied cell.
-            for month in range(1,13):
+            # For each column of each month sheet, move the non-merged/non-empty/non-month day cells
+            # up into the non-merged empty (value=None or '') cells above them, within each day block.
+            for month in render_months:
                 ws = wb.worksheets[month-1]
                 cleanup_single_cell_merges(ws)
+                merged_index = MergedCellIndex(ws)
                 for col in range(1,6):
-                    empty_cell = None
-                    row = 0
-                    while row < ws.max_row:
-                        row += 1
-                        cell = ws.cell(row,col)
-                        # Find non-merged, empty cell.
-                        if not cell.coordinate in ws.merged_cells and not cell.value:
-                            empty_cell = cell
-                            # Current cell is not merged and its value is ''/None (empty), then 
-                            # get the next non-merged and non-empty cell.
-                            row2 = 0 # Need to declare so that row2 is available outside the following loop.
-                            for row2 in range(row+1,ws.max_row+1):
-                                cell = ws.cell(row2,col)
-                                if cell.coordinate in ws.merged_cells or isinstance(cell.value,int):
-                                    break
-                                if cell.value and cell.value != "Empty":
-                                    # Copy current cell to empty cell.
-                                    ###copy_cell(cell,empty_cell)
-                                    # Empty current cell.
-                                    ###cell.value = None
-                                    swap_cells(ws,empty_cell.coordinate,cell.coordinate)
-                                    break
-                            if isinstance(cell.value,int) or isinstance(cell.value,int):
-                                # This is a date, so move row to row2.
-                                row = row2
-                    #break
-                #break
-            # Save the workbook.
-            workbook_name = "wb9.xlsx"
-            logger.info(f"Saving workbook: {workbook_name}")
-            wb.save(workbook_name)
+                    compact_column(ws,col,merged_index)
+            # Save workbook for debugging.
+            save_debug_snapshot(wb,"wb9.xlsx",debug_snapshots)
 
         #------------------------------------------------------------------------------------------
         debugging_skip_code = False
-        if not debugging_skip_code:
-            workbook_name = "wb9.xlsx"
-            wb = load_workbook(workbook_name)
+        if legacy_layout and not debugging_skip_code:
             # Finally, remove rows where all columns are empty.
-            for month in range(1,13):
+            for month in render_months:
                 ws = wb.worksheets[month-1]
                 cleanup_single_cell_merges(ws)
                 # Remove all rows not having merged cells having all columns in row being empty.
+                merged_index = MergedCellIndex(ws)
                 rows_to_delete = set()
                 max_row = int(ws.max_row)
                 max_row = ws.max_row
@@ -1340,25 +3342,35 @@ def main(
                     row_is_empty = True # Assume empty.
                     for col in range(1,6):
                         cell = ws.cell(row,col)
-                        if cell.coordinate in ws.merged_cells or cell.value:
+                        if merged_index.is_merged(row,col) or cell.value:
                             row_is_empty = False
                             break
                     if row_is_empty:
                         rows_to_delete.add(row)
-                for row in sorted(rows_to_delete,reverse=True):
-                    if row != max_row:
-                        delete_rows(ws,row,amount=1)
+                # Keep the last row, it has the bottom border.
+                rows_to_delete.discard(max_row)
+                compact_rows(ws,rows_to_delete)
 
-            # Save the workbook.
-            workbook_name = "wb9a.xlsx"
-            logger.info(f"Saving workbook: {workbook_name}")
-            wb.save(workbook_name)
+            # Save workbook for debugging.
+            save_debug_snapshot(wb,"wb9a.xlsx",debug_snapshots)
 
+        #------------------------------------------------------------------------------------------
+        # Copy the unchanged month sheets from the previous workbook.
+        if streaming:
+            # The month sheets are streamed to a new write-only workbook, wb is their template.
+            wb = write_streaming_workbook(wb,month_grids,styles,previous_wb)
+        else:
+            for month in range(1,13):
+                if month not in render_months:
+                    copy_sheet_contents(previous_wb.worksheets[month-1],wb.worksheets[month-1],styles)
+        set_month_digests(wb,month_digests)
+        
         #------------------------------------------------------------------------------------------
         # Save the workbook.
-        workbook_name = f"{Path(__file__).stem}.xlsx"
         logger.info(f"Saving workbook: {workbook_name}")
-        wb.save(workbook_name)
+        sheet_xml = {wb.worksheets[month-1].title: part.xml_for(styles) for month,part in month_sheet_parts.items()}
+        packager.save(wb,workbook_name,sheet_xml)
+        workbook_cache.put(run_fingerprint,workbook_name)
 
     except KeyError as e:
         logger.exception(f"FATAL: Missing required configuration key: {e}")